@@ -0,0 +1,79 @@
+"""
+Query parameter filters for the admin order queue.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from core.models import Order
+
+
+ORDER_STATUSES = {value for value, label in Order.choice}
+
+
+def parse_moment(name, value, end=False):
+    """
+    Parse an ISO date or datetime; a date bound covers that whole day.
+    """
+    try:
+        day = parse_date(value)
+        moment = None if day is not None else parse_datetime(value)
+    except ValueError:
+        day = moment = None
+    if day is not None:
+        if end:
+            day += timedelta(days=1)
+        moment = datetime.combine(day, time.min)
+    elif moment is None:
+        raise ValidationError({name: 'Use an ISO 8601 date or datetime.'})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_id(name, value):
+    """Parse an integer id query parameter."""
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: 'Must be an integer.'})
+
+
+def filter_orders(queryset, params):
+    """
+    Filter orders by the admin queue query parameters.
+
+    ``order_status`` takes one or more comma-separated statuses,
+    ``date_from`` and ``date_to`` bound ``date_ordered`` (``date_to`` is
+    exclusive for datetimes and inclusive for dates), and ``customer_id``
+    selects one customer.
+    """
+    if params.get('order_status'):
+        statuses = {
+            value.strip() for value in params['order_status'].split(',')
+            if value.strip()
+        }
+        unknown = statuses - ORDER_STATUSES
+        if unknown:
+            raise ValidationError(
+                {'order_status':
+                 f'Unknown statuses: {", ".join(sorted(unknown))}.'})
+        if len(statuses) == 1:
+            queryset = queryset.filter(order_status=statuses.pop())
+        else:
+            queryset = queryset.filter(order_status__in=sorted(statuses))
+
+    if params.get('date_from'):
+        queryset = queryset.filter(date_ordered__gte=parse_moment(
+            'date_from', params['date_from']))
+    if params.get('date_to'):
+        queryset = queryset.filter(date_ordered__lt=parse_moment(
+            'date_to', params['date_to'], end=True))
+
+    if params.get('customer_id'):
+        queryset = queryset.filter(
+            customer_id=parse_id('customer_id', params['customer_id']))
+
+    return queryset
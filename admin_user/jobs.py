@@ -0,0 +1,86 @@
+"""
+Background jobs started from the admin API.
+
+Jobs run on a small in-process thread pool. Their state is kept in the
+``Job`` table, so it can be polled through
+``admin-user/discount-jobs/<job_id>/`` on any worker.
+
+A discount job reads the category's discount again for every chunk
+rather than applying the percentage it was started with. A discount
+changed or deleted while the job runs is followed by the rest of the
+job, and jobs overlapping on one category converge on the same prices.
+"""
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+
+from core.models import Discount, Job, Product
+from store.catalog_cache import bump_catalog_version
+
+
+DISCOUNT_CHUNK_SIZE = 1000
+
+_executor = ThreadPoolExecutor(max_workers=2)
+
+
+def get_job(job_id):
+    """Return the state of a job or None."""
+    return Job.objects.filter(pk=job_id).values(
+        'id', 'status', 'done', 'total', 'error').first()
+
+
+def _set_job(job_id, **state):
+    Job.objects.update_or_create(pk=job_id, defaults=state)
+
+
+def current_percentage(category_id):
+    """
+    Return the category's discount percentage, 0 without a discount.
+
+    The discount row is locked until the caller's transaction ends, so it
+    cannot change while a chunk is priced from it.
+    """
+    percentage = Discount.objects.select_for_update().filter(
+        category_id=category_id).values_list('percentage', flat=True).first()
+    return percentage or 0
+
+
+def run_discount_job(job_id, category_id, chunk_size=DISCOUNT_CHUNK_SIZE):
+    """Apply a category's discount in chunks, recording progress."""
+    def progress(done, total):
+        _set_job(job_id, status='running', done=done, total=total)
+
+    try:
+        done = Product.objects.filter(category_id=category_id).apply_discount(
+            lambda: current_percentage(category_id),
+            chunk_size=chunk_size, progress=progress)
+    except Exception as error:
+        _set_job(job_id, status='failed', error=str(error))
+        raise
+    finally:
+        bump_catalog_version()
+
+    _set_job(job_id, status='done', done=done, total=done)
+
+
+def _run_in_thread(job_id, category_id):
+    try:
+        run_discount_job(job_id, category_id)
+    finally:
+        connections.close_all()
+
+
+def start_discount_job(category_id):
+    """
+    Queue a background discount propagation and return its job id.
+
+    The job is submitted once the current transaction commits so it sees
+    the discount that triggered it.
+    """
+    job_id = uuid.uuid4().hex
+    Job.objects.create(pk=job_id)
+    transaction.on_commit(lambda: _executor.submit(
+        _run_in_thread, job_id, category_id))
+    return job_id
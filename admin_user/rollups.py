@@ -0,0 +1,161 @@
+"""
+Incremental sales rollups.
+
+Hourly and daily totals (revenue, orders, units), per product and per
+category, are kept in the rollup tables so dashboards never aggregate raw
+order lines. ``update_rollups`` folds in the orders completed since the
+high-water mark stored in ``RollupState`` and moves the mark forward in
+the same transaction, so each order is counted exactly once however
+often it runs.
+
+Orders completed within ``SETTLE_DELAY`` of now are left for the next
+run, so a checkout that commits a little after its ``completed_at`` is
+not skipped. Changes to an order after it has been rolled up are not
+reflected; ``rebuild_rollups`` recomputes everything.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from core.models import (
+    ROLLUP_PERIODS,
+    CategorySalesRollup,
+    Order,
+    OrderItem,
+    ProductSalesRollup,
+    RollupState,
+    SalesRollup,
+)
+
+
+STATE_NAME = 'sales'
+
+SETTLE_DELAY = timedelta(minutes=1)
+
+# Orders folded in per transaction are bounded by this span of time.
+WINDOW = timedelta(days=1)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+PERIODS = [period for period, label in ROLLUP_PERIODS]
+
+ROLLUP_MODELS = (SalesRollup, ProductSalesRollup, CategorySalesRollup)
+
+
+def _line_revenue():
+    return Sum(F('item_price') * F('quantity'), output_field=DecimalField(
+        max_digits=14, decimal_places=2))
+
+
+def _merge(model, period, keys, rows):
+    """
+    Add ``rows`` of increments to the rollup rows of ``model``.
+
+    ``keys`` name the columns identifying a row besides the period; every
+    other column of a row is a measure added to the stored value with an
+    ``F()`` expression.
+    """
+    if not rows:
+        return
+    existing = {
+        tuple(getattr(rollup, key) for key in keys): rollup
+        for rollup in model.objects.filter(
+            period=period, bucket__in={row['bucket'] for row in rows})
+    }
+    to_create, to_update, measures = [], [], set()
+    for row in rows:
+        values = {
+            name: value for name, value in row.items() if name not in keys}
+        measures.update(values)
+        rollup = existing.get(tuple(row[key] for key in keys))
+        if rollup is None:
+            to_create.append(model(period=period, **row))
+            continue
+        for name, value in values.items():
+            setattr(rollup, name, F(name) + value)
+        to_update.append(rollup)
+    model.objects.bulk_create(to_create)
+    if to_update:
+        model.objects.bulk_update(to_update, sorted(measures))
+
+
+def _fold(start, end):
+    """Add orders completed in ``(start, end]`` to every rollup."""
+    orders = Order.objects.filter(
+        complete=True, completed_at__gt=start, completed_at__lte=end)
+    lines = OrderItem.objects.filter(
+        order__complete=True,
+        order__completed_at__gt=start, order__completed_at__lte=end)
+
+    for period in PERIODS:
+        totals = {
+            row['bucket']: dict(row, units=0)
+            for row in orders.annotate(
+                bucket=Trunc('completed_at', period),
+            ).values('bucket').annotate(
+                revenue=Sum('cart_total'), order_count=Count('id'))
+        }
+        lines_by_bucket = lines.annotate(
+            bucket=Trunc('order__completed_at', period))
+        for row in lines_by_bucket.values('bucket').annotate(
+                units=Sum('quantity')):
+            totals[row['bucket']]['units'] = row['units']
+        _merge(SalesRollup, period, ['bucket'], list(totals.values()))
+
+        _merge(ProductSalesRollup, period, ['bucket', 'product_id'], list(
+            lines_by_bucket.values('bucket', 'product_id').annotate(
+                units=Sum('quantity'), revenue=_line_revenue())))
+        _merge(CategorySalesRollup, period, ['bucket', 'category_id'], list(
+            lines_by_bucket.values(
+                'bucket', category_id=F('product__category_id'),
+            ).annotate(units=Sum('quantity'), revenue=_line_revenue())))
+
+    return orders.count()
+
+
+def update_rollups(now=None):
+    """
+    Fold newly completed orders into the rollups.
+
+    Returns ``(orders, windows)``: how many orders were added and in how
+    many transactions.
+    """
+    upto = (now or timezone.now()) - SETTLE_DELAY
+    folded = windows = 0
+    while True:
+        with transaction.atomic():
+            state, created = RollupState.objects.select_for_update(
+            ).get_or_create(name=STATE_NAME, defaults={'high_water': EPOCH})
+            start = state.high_water
+            first = Order.objects.filter(
+                complete=True, completed_at__gt=start, completed_at__lte=upto,
+            ).order_by('completed_at').values_list(
+                'completed_at', flat=True).first()
+            if first is None:
+                if upto > start:
+                    state.high_water = upto
+                    state.save(update_fields=['high_water'])
+                return folded, windows
+            end = min(upto, first + WINDOW)
+            folded += _fold(start, end)
+            windows += 1
+            state.high_water = end
+            state.save(update_fields=['high_water'])
+
+
+def rebuild_rollups(now=None):
+    """Drop every rollup and compute them again from all orders."""
+    with transaction.atomic():
+        for model in ROLLUP_MODELS:
+            model.objects.all().delete()
+        RollupState.objects.filter(name=STATE_NAME).delete()
+    return update_rollups(now)
+
+
+def high_water_mark():
+    """Return the time up to which the rollups are complete, or None."""
+    return RollupState.objects.filter(name=STATE_NAME).values_list(
+        'high_water', flat=True).first()
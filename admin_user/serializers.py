@@ -1,10 +1,16 @@
 """Serializer for admin users."""
 from rest_framework import serializers
+from django.db import transaction
 from django.http import Http404
 
 from core.models import (
-    Category, Discount, OrderItem, Tag, Product, ProductTagConnector, Order
+    Category, Discount, OrderItem, Tag, Product, ProductTagConnector, Order,
+    OrderEvent,
 )
+from core.fast_serializers import CompiledListSerializer
+from core.sparse import SparseFieldsMixin, prepare_queryset, wants
+from store.catalog_cache import bump_catalog_version
+from admin_user.jobs import start_discount_job
 
 
 class TagSerialiser(serializers.Serializer):
@@ -57,12 +63,14 @@ class DiscountSerializer(serializers.Serializer):
     name = serializers.CharField()
     percentage = serializers.IntegerField()
 
-    def _apply_discount_on_product(self, category):
+    def _apply_discount_on_product(self, category_id, percentage):
         """When discount is added then apply to the product price."""
-        products = Product.objects.filter(category=category)
-        for product in products:
-            product.calculate_discount()
-            product.save()
+        if self.context.get('background'):
+            self.job_id = start_discount_job(category_id)
+            return
+        Product.objects.filter(
+            category_id=category_id).apply_discount(percentage)
+        bump_catalog_version()
 
     def create(self, validated_data):
         category_id = validated_data['category_id']
@@ -70,23 +78,31 @@ class DiscountSerializer(serializers.Serializer):
             category = Category.objects.get(id=category_id)
         except:
             raise Http404
-        discount = Discount.objects.create(
-            category_id=validated_data['category_id'],
-            name=validated_data['name'],
-            percentage=validated_data['percentage']
-        )
-        self._apply_discount_on_product(category)
+        with transaction.atomic():
+            discount = Discount.objects.create(
+                category_id=validated_data['category_id'],
+                name=validated_data['name'],
+                percentage=validated_data['percentage']
+            )
+            self._apply_discount_on_product(
+                discount.category_id, discount.percentage)
         return discount
 
     def update(self, instance, validated_data):
+        previous_category_id = instance.category_id
         instance.category_id = validated_data.get(
             'category_id', instance.category_id)
         instance.name = validated_data.get('name', instance.name)
         instance.percentage = validated_data.get(
             'percentage', instance.percentage)
 
-        instance.save()
-        self._apply_discount_on_product(instance.category)
+        with transaction.atomic():
+            instance.save()
+            if previous_category_id != instance.category_id:
+                Product.objects.filter(
+                    category_id=previous_category_id).apply_discount(0)
+            self._apply_discount_on_product(
+                instance.category_id, instance.percentage)
 
         return instance
 
@@ -172,33 +188,111 @@ class TagProductConnectorSerializer(serializers.Serializer):
 
 class OrderItemSerializer(serializers.Serializer):
     id = serializers.IntegerField()
-    product = serializers.CharField()
+    product = serializers.CharField(source='name')
     quantity = serializers.IntegerField()
-    item_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    item_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, source='unit_price')
 
+    class Meta:
+        list_serializer_class = CompiledListSerializer
 
-class OrderSerializer(serializers.Serializer):
+
+class OrderSerializer(SparseFieldsMixin, serializers.Serializer):
     id = serializers.IntegerField()
     customer = serializers.CharField()
     date_ordered = serializers.DateTimeField()
     complete = serializers.BooleanField()
-    order_status = serializers.CharField()
+    order_status = serializers.ChoiceField(choices=Order.choice)
     cart_total = serializers.DecimalField(max_digits=10, decimal_places=2)
     paid_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
     order_items = OrderItemSerializer(many=True)
 
+    class Meta:
+        list_serializer_class = CompiledListSerializer
+        expandable_fields = ('order_items',)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None, extra=()):
+        """Load what serializing ``fields`` of the orders needs."""
+        queryset = prepare_queryset(queryset, cls, fields, extra=extra)
+        if wants(fields, 'cart_total'):
+            queryset = queryset.with_cart_total()
+        if wants(fields, 'order_items'):
+            queryset = queryset.with_items()
+        return queryset
+
+    def validate_complete(self, value):
+        """
+        Orders are completed by checkout only.
+
+        Checkout freezes the line prices, reserves stock and logs the
+        status change; flipping the flag here would skip all of it.
+        """
+        if self.instance is not None and value != self.instance.complete:
+            raise serializers.ValidationError(
+                'Orders are completed by placing them, not by an update.')
+        return value
+
     def update(self, instance, validated_data):
-        instance.complete = validated_data.get('complete', instance.complete)
         instance.cart_total = validated_data.get(
             'cart_total', instance.cart_total)
         instance.paid_amount = validated_data.get(
             'paid_amount', instance.paid_amount)
+        previous_status = instance.order_status
         instance.order_status = validated_data.get(
             'order_status', instance.order_status
         )
         # instance.order_items = validated_data.get(
         #     'order_items', instance.order_items)
 
-        instance.save()
+        with transaction.atomic():
+            instance.save()
+            OrderEvent.record(
+                instance, previous_status, instance.order_status)
 
         return instance
+
+
+class SalesRollupSerializer(serializers.Serializer):
+    """Serializer for sales totals of one period."""
+    bucket = serializers.DateTimeField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    order_count = serializers.IntegerField()
+    units = serializers.IntegerField()
+
+    class Meta:
+        list_serializer_class = CompiledListSerializer
+
+
+class ProductSalesRollupSerializer(serializers.Serializer):
+    """Serializer for sales of one product in one period."""
+    bucket = serializers.DateTimeField()
+    product_id = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
+
+    class Meta:
+        list_serializer_class = CompiledListSerializer
+
+
+class CategorySalesRollupSerializer(serializers.Serializer):
+    """Serializer for sales of one category in one period."""
+    bucket = serializers.DateTimeField()
+    category_id = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    units = serializers.IntegerField()
+
+    class Meta:
+        list_serializer_class = CompiledListSerializer
+
+
+class OrderEventSerializer(serializers.Serializer):
+    """Serializer for a change of order status."""
+    id = serializers.IntegerField()
+    order_id = serializers.IntegerField()
+    from_status = serializers.CharField()
+    to_status = serializers.CharField()
+    created = serializers.DateTimeField()
+
+    class Meta:
+        list_serializer_class = CompiledListSerializer
@@ -1,17 +1,36 @@
 """Test For Custom User Site."""
+import json
+
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from decimal import Decimal
+
 from core.models import (
     Category,
+    Customer,
     Discount,
+    Order,
+    OrderEvent,
+    OrderItem,
+    Product,
+    ProductSalesRollup,
+    SalesRollup,
 )
 
+from admin_user import jobs
+from admin_user.jobs import get_job, run_discount_job
+from admin_user.rollups import rebuild_rollups, update_rollups
 from admin_user.serializers import (
     DiscountSerializer,
     TagSerialiser,
@@ -21,6 +40,9 @@ from admin_user.serializers import (
 DISCOUNT_URL = reverse('admin_user:discount')
 TAG_URL = reverse('admin_user:tags')
 CATEGORY_URL = reverse('admin_user:category')
+ORDERS_URL = reverse('admin_user:admin-orders')
+STATS_URL = reverse('admin_user:stats')
+EVENTS_URL = reverse('admin_user:order-events')
 
 
 def get_tag_url(tag_id):
@@ -97,6 +119,107 @@ class PrivateDiscountAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data['name'], payload['name'])
 
+    def test_discount_applied_to_category_products(self):
+        """Test adding a discount updates every product in the category."""
+        category = Category.objects.create(name='Electronics')
+        other = Category.objects.create(name='Books')
+        for price in ('100.00', '250.50'):
+            Product.objects.create(
+                category=category, name='Laptop', price=Decimal(price))
+        book = Product.objects.create(
+            category=other, name='Novel', price=Decimal('10.00'))
+        payload = {
+            'category_id': category.id,
+            'name': 'Eid Discount',
+            'percentage': 20,
+        }
+
+        with self.assertNumQueries(9):
+            self.client.post(DISCOUNT_URL, payload)
+
+        prices = Product.objects.filter(category=category).order_by(
+            'price').values_list('discount', 'discounted_price')
+        self.assertEqual(list(prices), [
+            (Decimal('20.00'), Decimal('80.00')),
+            (Decimal('50.10'), Decimal('200.40')),
+        ])
+        book.refresh_from_db()
+        self.assertEqual(book.discount, Decimal('0'))
+
+    def test_delete_discount_restores_prices(self):
+        """Test deleting a discount removes it from the products."""
+        category = Category.objects.create(name='Electronics')
+        product = Product.objects.create(
+            category=category, name='Laptop', price=Decimal('100.00'))
+        response = self.client.post(DISCOUNT_URL, {
+            'category_id': category.id,
+            'name': 'Eid Discount',
+            'percentage': 20,
+        })
+
+        self.client.delete(get_detail_url(response.data['id']))
+
+        product.refresh_from_db()
+        self.assertEqual(product.discount, Decimal('0'))
+        self.assertEqual(product.discounted_price, Decimal('100.00'))
+
+    def test_add_discount_in_background(self):
+        """Test a background discount returns a job to poll."""
+        category = Category.objects.create(name='Electronics')
+        payload = {
+            'category_id': category.id,
+            'name': 'Eid Discount',
+            'percentage': 20,
+        }
+
+        response = self.client.post(
+            f'{DISCOUNT_URL}?background=true', payload)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        # The state is in the database, not in this worker's cache.
+        cache.clear()
+        job = self.client.get(
+            reverse('admin_user:discount-job', args=[response.data['job']]))
+        self.assertEqual(job.data['status'], 'pending')
+
+    def test_discount_job_reports_progress(self):
+        """Test the chunked discount job records its progress."""
+        category = Category.objects.create(name='Electronics')
+        Discount.objects.create(
+            category=category, name='Eid Discount', percentage=10)
+        for _ in range(5):
+            Product.objects.create(
+                category=category, name='Laptop', price=Decimal('100.00'))
+
+        run_discount_job('job', category.id, chunk_size=2)
+
+        self.assertEqual(get_job('job')['status'], 'done')
+        self.assertEqual(get_job('job')['done'], 5)
+        self.assertFalse(Product.objects.exclude(
+            discounted_price=Decimal('90.00')).exists())
+
+    def test_discount_job_follows_deleted_discount(self):
+        """Test chunks after a discount is deleted keep regular prices."""
+        category = Category.objects.create(name='Electronics')
+        discount = Discount.objects.create(
+            category=category, name='Eid Discount', percentage=10)
+        for _ in range(5):
+            Product.objects.create(
+                category=category, name='Laptop', price=Decimal('100.00'))
+        set_job = jobs._set_job
+
+        def delete_after_first_chunk(job_id, **state):
+            if state.get('done') == 2:
+                discount.delete()
+            set_job(job_id, **state)
+
+        with patch.object(jobs, '_set_job', delete_after_first_chunk):
+            run_discount_job('job', category.id, chunk_size=2)
+
+        self.assertEqual(get_job('job')['status'], 'done')
+        self.assertFalse(Product.objects.exclude(
+            discounted_price=Decimal('100.00')).exists())
+
     def test_discount_update(self):
         """Test discount update."""
         category = Category.objects.create(
@@ -226,3 +349,330 @@ class PrivateDiscountAPITest(TestCase):
         response = self.client.delete(url)
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_stream_category_list(self):
+        """Test streaming the category list returns the same payload."""
+        for name in ('Electronics', 'Books', 'Toys'):
+            Category.objects.create(name=name)
+
+        expected = self.client.get(CATEGORY_URL).data
+        response = self.client.get(
+            CATEGORY_URL, {'stream': 'true', 'chunk_size': 2})
+
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content)
+        self.assertEqual(json.loads(body), expected)
+
+    def test_stream_completed_orders(self):
+        """Test streaming completed orders includes their totals."""
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        customer = Customer.objects.create(user=user, name='Customer')
+        category = Category.objects.create(name='Electronics')
+        product = Product.objects.create(
+            category=category, name='Laptop', price=100)
+        for _ in range(3):
+            order = Order.objects.create(
+                customer=customer, complete=True, cart_total=200)
+            OrderItem.objects.create(
+                order=order, product=product, quantity=2,
+                item_price=100, product_name='Laptop')
+
+        with self.assertNumQueries(2):
+            response = self.client.get(ORDERS_URL, {'stream': '1'})
+            orders = json.loads(b''.join(response.streaming_content))
+
+        self.assertEqual(len(orders), 3)
+        self.assertEqual(
+            {order['cart_total'] for order in orders}, {'200.00'})
+        self.assertEqual(orders[0]['order_items'][0]['product'], 'Laptop')
+
+
+class AdminOrderQueueTest(TestCase):
+    """Test filtering and paging the admin order queue."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            email='admin@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.customers = []
+        for index in range(2):
+            user = get_user_model().objects.create_user(
+                email=f'user{index}@example.com', password='testpass123')
+            self.customers.append(
+                Customer.objects.create(user=user, name=f'Customer {index}'))
+        self.orders = []
+        statuses = ['Confirmed', 'Shipped', 'Delivered']
+        for day in range(1, 7):
+            order = Order.objects.create(
+                customer=self.customers[day % 2], complete=True,
+                order_status=statuses[day % 3])
+            Order.objects.filter(pk=order.pk).update(
+                date_ordered=datetime(2024, 3, day, 12, tzinfo=timezone.utc))
+            self.orders.append(order)
+        Order.objects.create(customer=self.customers[0])
+
+    def _ids(self, params):
+        response = self.client.get(ORDERS_URL, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [order['id'] for order in response.data['orders']]
+
+    def test_orders_filtered_by_status(self):
+        """Test filtering by one or more statuses."""
+        shipped = [order.pk for order in self.orders
+                   if order.order_status == 'Shipped']
+
+        self.assertEqual(self._ids({'order_status': 'Shipped'}),
+                         shipped[::-1])
+        self.assertEqual(
+            len(self._ids({'order_status': 'Shipped,Delivered'})), 4)
+
+    def test_orders_filtered_by_date_and_customer(self):
+        """Test date bounds are inclusive days and customers filter."""
+        ids = self._ids({'date_from': '2024-03-02', 'date_to': '2024-03-04'})
+        self.assertEqual(ids, [order.pk for order in self.orders[1:4]][::-1])
+
+        ids = self._ids({'customer_id': self.customers[0].pk})
+        self.assertEqual(
+            ids, [order.pk for order in self.orders[1::2]][::-1])
+
+    def test_orders_keyset_pages(self):
+        """Test walking the queue with cursors visits every order once."""
+        response = self.client.get(ORDERS_URL, {'page_size': 4})
+        first = [order['id'] for order in response.data['orders']]
+        self.assertIsNone(response.data['prev'])
+
+        response = self.client.get(
+            ORDERS_URL, {'page_size': 4, 'cursor': response.data['next']})
+        second = [order['id'] for order in response.data['orders']]
+
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(
+            first + second, [order.pk for order in self.orders][::-1])
+
+    def test_orders_invalid_filters(self):
+        """Test unknown statuses and bad dates are rejected."""
+        for params in ({'order_status': 'Lost'}, {'date_from': 'March'},
+                       {'date_to': '2024-02-30'}, {'customer_id': 'me'}):
+            response = self.client.get(ORDERS_URL, params)
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OrderEventFeedTest(TestCase):
+    """Test the order status log and its feed."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            email='admin@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        self.customer = Customer.objects.create(user=user, name='Customer')
+        self.orders = [
+            Order.objects.create(
+                customer=self.customer, complete=True,
+                order_status='Confirmed')
+            for index in range(2)
+        ]
+
+    def _set_status(self, order, order_status):
+        url = reverse('admin_user:admin-order-detail', args=[order.pk])
+        return self.client.patch(url, {'order_status': order_status})
+
+    def test_status_changes_are_logged(self):
+        """Test admin status updates append events, unchanged ones do not."""
+        self._set_status(self.orders[0], 'Shipped')
+        self._set_status(self.orders[0], 'Shipped')
+        self._set_status(self.orders[0], 'Delivered')
+
+        events = OrderEvent.objects.filter(order=self.orders[0])
+        self.assertEqual(
+            [(event.from_status, event.to_status)
+             for event in events.order_by('id')],
+            [('Confirmed', 'Shipped'), ('Shipped', 'Delivered')])
+
+    def test_complete_cannot_be_set(self):
+        """Test an open order is not completed through the admin API."""
+        order = Order.objects.create(customer=self.customer)
+        url = reverse('admin_user:admin-order-detail', args=[order.pk])
+
+        response = self.client.patch(url, {'complete': True})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        order.refresh_from_db()
+        self.assertFalse(order.complete)
+        self.assertFalse(OrderEvent.objects.filter(order=order).exists())
+
+    def test_unknown_status_rejected(self):
+        """Test only known statuses can be set."""
+        response = self._set_status(self.orders[0], 'Lost')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(OrderEvent.objects.exists())
+
+    def test_feed_is_tailed_with_cursor(self):
+        """Test each event is returned once when following ``next``."""
+        self._set_status(self.orders[0], 'Shipped')
+        self._set_status(self.orders[1], 'Shipped')
+
+        response = self.client.get(EVENTS_URL, {'page_size': 1})
+        first = response.data['events']
+        response = self.client.get(
+            EVENTS_URL, {'since': response.data['next']})
+        second = response.data['events']
+        self.assertEqual(
+            [event['order_id'] for event in first + second],
+            [order.pk for order in self.orders])
+
+        self._set_status(self.orders[0], 'Delivered')
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                EVENTS_URL, {'since': response.data['next']})
+        self.assertEqual(len(response.data['events']), 1)
+        self.assertEqual(response.data['events'][0]['to_status'], 'Delivered')
+
+        response = self.client.get(
+            EVENTS_URL, {'since': response.data['next']})
+        self.assertEqual(response.data['events'], [])
+        self.assertEqual(
+            response.data['next'], OrderEvent.objects.latest('id').id)
+
+    def test_feed_filtered_by_order(self):
+        """Test the feed narrowed to one order's timeline."""
+        self._set_status(self.orders[0], 'Shipped')
+        self._set_status(self.orders[1], 'Shipped')
+
+        response = self.client.get(
+            EVENTS_URL, {'order_id': self.orders[1].pk})
+
+        self.assertEqual(
+            [event['order_id'] for event in response.data['events']],
+            [self.orders[1].pk])
+
+    def test_events_outlive_order(self):
+        """Test deleting an order keeps its events."""
+        self._set_status(self.orders[0], 'Shipped')
+        self.orders[0].delete()
+
+        response = self.client.get(EVENTS_URL)
+
+        self.assertEqual(len(response.data['events']), 1)
+
+
+class SalesRollupTest(TestCase):
+    """Test the sales rollups and the stats endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            email='admin@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Electronics')
+        self.laptop = Product.objects.create(
+            category=self.category, name='Laptop', price=100)
+        self.phone = Product.objects.create(
+            category=self.category, name='Phone', price=50)
+        self.customers = []
+        for index in range(3):
+            user = get_user_model().objects.create_user(
+                email=f'user{index}@example.com', password='testpass123')
+            self.customers.append(Customer.objects.create(user=user))
+        self.now = datetime(2024, 3, 2, 12, 30, tzinfo=timezone.utc)
+
+    def _placed(self, customer, completed_at, lines):
+        total = sum(price * quantity for product, price, quantity in lines)
+        order = Order.objects.create(
+            customer=customer, complete=True, cart_total=total,
+            paid_amount=total, completed_at=completed_at)
+        for product, price, quantity in lines:
+            OrderItem.objects.create(
+                order=order, product=product, quantity=quantity,
+                item_price=price, product_name=product.name)
+        return order
+
+    def _day_totals(self):
+        return {
+            rollup.bucket.day: (rollup.revenue, rollup.order_count,
+                                rollup.units)
+            for rollup in SalesRollup.objects.filter(period='day')
+        }
+
+    def test_rollups_are_incremental(self):
+        """Test each order is counted once across runs."""
+        self._placed(self.customers[0], self.now - timedelta(days=1),
+                     [(self.laptop, 100, 2), (self.phone, 50, 1)])
+        self._placed(self.customers[1], self.now - timedelta(hours=2),
+                     [(self.phone, 40, 3)])
+
+        self.assertEqual(update_rollups(self.now), (2, 1))
+        self.assertEqual(update_rollups(self.now), (0, 0))
+        self._placed(self.customers[2], self.now + timedelta(minutes=10),
+                     [(self.laptop, 100, 1)])
+        self.assertEqual(update_rollups(self.now + timedelta(hours=1)), (1, 1))
+
+        self.assertEqual(self._day_totals(), {
+            1: (Decimal('250.00'), 1, 3),
+            2: (Decimal('220.00'), 2, 4),
+        })
+        phone = ProductSalesRollup.objects.filter(
+            period='day', product=self.phone).order_by('bucket')
+        self.assertEqual(
+            [(rollup.units, rollup.revenue) for rollup in phone],
+            [(1, Decimal('50.00')), (3, Decimal('120.00'))])
+        self.assertEqual(SalesRollup.objects.filter(period='hour').count(), 3)
+
+    def test_recent_orders_wait_for_next_run(self):
+        """Test orders inside the settle delay are left for later."""
+        self._placed(self.customers[0], self.now - timedelta(seconds=10),
+                     [(self.laptop, 100, 1)])
+
+        self.assertEqual(update_rollups(self.now), (0, 0))
+        self.assertEqual(
+            update_rollups(self.now + timedelta(minutes=5)), (1, 1))
+
+    def test_rebuild_matches_incremental(self):
+        """Test rebuilding gives the same rollups."""
+        for day in range(3):
+            completed_at = self.now + timedelta(days=day)
+            self._placed(self.customers[day], completed_at,
+                         [(self.laptop, 100, day + 1)])
+            update_rollups(completed_at + timedelta(hours=1))
+        incremental = self._day_totals()
+
+        rebuild_rollups(self.now + timedelta(days=3))
+
+        self.assertEqual(self._day_totals(), incremental)
+
+    def test_stats_endpoint(self):
+        """Test the stats endpoint serves rollups by group."""
+        self._placed(self.customers[0], self.now - timedelta(hours=1),
+                     [(self.laptop, 100, 2), (self.phone, 50, 1)])
+        call_command('rollup_sales', stdout=StringIO())
+
+        params = {'period': 'hour', 'date_from': '2024-03-02',
+                  'date_to': '2024-03-02'}
+        with self.assertNumQueries(2):
+            response = self.client.get(STATS_URL, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{
+            'bucket': '2024-03-02T11:00:00Z', 'revenue': '250.00',
+            'order_count': 1, 'units': 3,
+        }])
+
+        response = self.client.get(
+            STATS_URL, dict(params, by='product',
+                            product_id=self.phone.id))
+        self.assertEqual(
+            [(row['product_id'], row['units'])
+             for row in response.data['results']],
+            [(self.phone.id, 1)])
+
+    def test_stats_rejects_unknown_group(self):
+        """Test invalid periods and groups return 400."""
+        for params in ({'period': 'week'}, {'by': 'customer'}):
+            response = self.client.get(STATS_URL, params)
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -16,9 +16,14 @@ urlpatterns = [
     path('discount/', views.DiscountList.as_view(), name='discount'),
     path('discount-detail/<int:pk>/', views.DiscountDetail.as_view(),
          name='discount-detail'),
+    path('discount-jobs/<str:job_id>/', views.DiscountJobDetail.as_view(),
+         name='discount-job'),
     path('orders/', views.AdminOrderList.as_view(), name='admin-orders'),
     path('order-detail/<int:pk>/', views.AdminOrderDetail.as_view(),
          name='admin-order-detail'),
+    path('order-events/', views.OrderEventFeed.as_view(),
+         name='order-events'),
     path('tag-product/', views.TagProductList.as_view(), name='tag-product'),
+    path('stats/', views.SalesStats.as_view(), name='stats'),
 
 ]
@@ -1,7 +1,11 @@
 """
 Views for our Ecommerce Store.
 """
+from datetime import timedelta
+
 from django.http import Http404
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
@@ -9,23 +13,26 @@ from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework import authentication
 from rest_framework import status
 
-from django.core.paginator import (
-    Paginator,
-    EmptyPage,
-    Page,
-    PageNotAnInteger
-)
-
-
 from core.models import (
     Category,
     Product,
     Order,
+    OrderEvent,
     OrderItem,
     Discount,
     ProductTagConnector,
     Tag,
+    load_cart_products,
+    SalesRollup,
+    ProductSalesRollup,
+    CategorySalesRollup,
 )
+from core.pagination import get_page_size, paginated_response_data
+from core.sparse import requested_fields, wants
+from core.streaming import is_stream_request, streaming_json_response
+from admin_user.filters import filter_orders, parse_id, parse_moment
+from admin_user.jobs import get_job
+from admin_user.rollups import high_water_mark
 
 from store.serializers import (
     ProductSerializer,
@@ -41,6 +48,10 @@ from admin_user.serializers import (
     DiscountSerializer,
     OrderItemSerializer,
     OrderSerializer,
+    SalesRollupSerializer,
+    ProductSalesRollupSerializer,
+    CategorySalesRollupSerializer,
+    OrderEventSerializer,
 )
 
 # permission_classes[IsAdminUser]
@@ -53,6 +64,9 @@ class TagList(APIView):
 
     def get(self, request, format=None):
         tags = Tag.objects.filter()
+        if is_stream_request(request):
+            return streaming_json_response(
+                tags.order_by('id'), TagSerialiser, request)
         serilizer = TagSerialiser(tags, many=True)
 
         return Response(serilizer.data, status=status.HTTP_200_OK)
@@ -116,6 +130,9 @@ class CatgoryList(APIView):
 
     def get(self, request, format=None):
         category = Category.objects.filter()
+        if is_stream_request(request):
+            return streaming_json_response(
+                category.order_by('id'), CategorySerializer, request)
         serializer = CategorySerializer(category, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -177,30 +194,16 @@ class ProductAdminList(APIView):
     serializer_class = ProductSerializer
 
     def get(self, request, format=None):
-        products = Product.objects.all().order_by('-id')
+        fields = requested_fields(request, self.serializer_class)
+        products = self.serializer_class.setup_eager_loading(
+            Product.objects.all(), fields)
 
         """Adding Pagination."""
-        page = request.query_params.get('page')
-        paginator = Paginator(products, 5)
+        data = paginated_response_data(
+            products, request, self.serializer_class, 'products',
+            fields=fields)
 
-        try:
-            products = paginator.page(page)
-        except PageNotAnInteger:
-            products = paginator.page(1)
-        except EmptyPage:
-            products = paginator.page(paginator.num_pages)
-
-        if page is None:
-            page = 1
-        page = int(page)
-
-        serializer = self.serializer_class(products, many=True)
-
-        return Response({
-            'products': serializer.data,
-            'page': page,
-            'pages': paginator.num_pages
-        }, status=status.HTTP_200_OK)
+        return Response(data, status=status.HTTP_200_OK)
 
     # @permission_classes([IsAdminUser, IsAuthenticated])
     def post(self, request, format=None):
@@ -226,8 +229,13 @@ class ProductAdminDetail(APIView):
             raise Http404
 
     def get(self, request, pk, format=None):
-        product = self._get_object(pk)
-        serializer = ProductSerializer(product)
+        fields = requested_fields(request, self.serializer_class)
+        try:
+            product = self.serializer_class.setup_eager_loading(
+                Product.objects.all(), fields).get(id=pk)
+        except Product.DoesNotExist:
+            raise Http404
+        serializer = ProductSerializer(product, fields=fields)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -255,6 +263,21 @@ class ProductAdminDetail(APIView):
         return Response({'msg': 'Data Deleted Successfull'}, status=status.HTTP_204_NO_CONTENT)
 
 
+def _discount_context(request):
+    """Serializer context of discount writes; ?background=true queues a job."""
+    background = request.query_params.get('background') in ('1', 'true')
+    return {'request': request, 'background': background}
+
+
+def _discount_response(serializer, success_status):
+    """Answer 202 with the job id when propagation runs in the background."""
+    job_id = getattr(serializer, 'job_id', None)
+    if job_id is None:
+        return Response(serializer.data, status=success_status)
+    return Response({**serializer.data, 'job': job_id},
+                    status=status.HTTP_202_ACCEPTED)
+
+
 class DiscountList(APIView):
     """Apply discount to category."""
     serializer_class = DiscountSerializer
@@ -271,10 +294,10 @@ class DiscountList(APIView):
 
     def post(self, request, format=None):
         serializer = DiscountSerializer(
-            data=request.data, context={'request': request})
+            data=request.data, context=_discount_context(request))
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return _discount_response(serializer, status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
@@ -299,19 +322,21 @@ class DiscountDetail(APIView):
     def patch(self, request, pk, format=None):
         discount = self._get_object(pk)
         serializer = self.serializer_class(discount,
-                                           data=request.data, partial=True)
+                                           data=request.data, partial=True,
+                                           context=_discount_context(request))
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return _discount_response(serializer, status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def put(self, request, pk, format=None):
         discount = self._get_object(pk)
         serializer = DiscountSerializer(discount,
-                                        data=request.data, context={'request': request}, partial=True)
+                                        data=request.data, partial=True,
+                                        context=_discount_context(request))
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return _discount_response(serializer, status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk, format=None):
@@ -320,6 +345,77 @@ class DiscountDetail(APIView):
         return Response({'msg': 'Delelte Successfull'}, status=status.HTTP_204_NO_CONTENT)
 
 
+class DiscountJobDetail(APIView):
+    """Progress of a background discount propagation."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, job_id, format=None):
+        job = get_job(job_id)
+        if job is None:
+            raise Http404
+        return Response(job, status=status.HTTP_200_OK)
+
+
+class SalesStats(APIView):
+    """
+    Sales dashboards served from the rollup tables.
+
+    ``period`` is ``hour`` or ``day`` and ``by`` is ``total``, ``product``
+    or ``category`` (narrowed with ``product_id`` or ``category_id``).
+    ``date_from``/``date_to`` default to the last 48 hours or 30 days.
+    ``as_of`` tells up to when the rollups are complete.
+    """
+    permission_classes = [IsAdminUser]
+
+    groups = {
+        'total': (SalesRollup, SalesRollupSerializer, None),
+        'product': (
+            ProductSalesRollup, ProductSalesRollupSerializer, 'product_id'),
+        'category': (
+            CategorySalesRollup, CategorySalesRollupSerializer,
+            'category_id'),
+    }
+    default_spans = {
+        'hour': timedelta(hours=48),
+        'day': timedelta(days=30),
+    }
+
+    def get(self, request, format=None):
+        params = request.query_params
+        period = params.get('period', 'day')
+        by = params.get('by', 'total')
+        if period not in self.default_spans:
+            raise ValidationError({'period': 'Use hour or day.'})
+        if by not in self.groups:
+            raise ValidationError({'by': 'Use total, product or category.'})
+        model, serializer_class, key = self.groups[by]
+
+        if params.get('date_to'):
+            date_to = parse_moment('date_to', params['date_to'], end=True)
+        else:
+            date_to = timezone.now()
+        if params.get('date_from'):
+            date_from = parse_moment('date_from', params['date_from'])
+        else:
+            date_from = date_to - self.default_spans[period]
+
+        rollups = model.objects.filter(
+            period=period, bucket__gte=date_from, bucket__lt=date_to)
+        if key is not None and params.get(key):
+            rollups = rollups.filter(**{key: parse_id(key, params[key])})
+        ordering = ['bucket'] if key is None else ['bucket', key]
+        serializer = serializer_class(rollups.order_by(*ordering), many=True)
+
+        return Response({
+            'period': period,
+            'by': by,
+            'date_from': date_from,
+            'date_to': date_to,
+            'as_of': high_water_mark(),
+            'results': serializer.data,
+        }, status=status.HTTP_200_OK)
+
+
 class AdminOrderList(APIView):
     """View for listing all order."""
     permission_classes = [IsAdminUser]
@@ -328,14 +424,28 @@ class AdminOrderList(APIView):
     serializer_class = OrderSerializer
 
     def get(self, request, format=None):
-        # orders = Order.objects.filter().prefetch_related("orderitem_set")
-        orders = Order.objects.filter(complete=True)
-        for order in orders:
-            order.get_cart_total()
+        """
+        List completed orders, newest first, one keyset page at a time.
 
-        serializer = self.serializer_class(orders, many=True)
-
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        Filter with ``order_status``, ``date_from``, ``date_to`` and
+        ``customer_id``; page with the returned ``next``/``prev`` cursors.
+        """
+        # orders = Order.objects.filter().prefetch_related("orderitem_set")
+        fields = requested_fields(request, self.serializer_class)
+        orders = filter_orders(
+            Order.objects.filter(complete=True), request.query_params)
+        orders = self.serializer_class.setup_eager_loading(
+            orders, fields, extra=('date_ordered',))
+        prepare = Order.get_cart_total if wants(fields, 'cart_total') else None
+        if is_stream_request(request):
+            return streaming_json_response(
+                orders.order_by('id'), self.serializer_class, request,
+                prepare=prepare, fields=fields)
+
+        data = paginated_response_data(
+            orders, request, self.serializer_class, 'orders',
+            ordering=('date_ordered', 'id'), cursor_only=True, fields=fields)
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class AdminOrderDetail(APIView):
@@ -354,10 +464,18 @@ class AdminOrderDetail(APIView):
             raise Http404
 
     def get(self, request, pk, format=None):
-        order = Order.objects.get(pk=pk)
-        order.get_cart_total()
+        fields = requested_fields(request, self.serializer_class)
+        try:
+            order = self.serializer_class.setup_eager_loading(
+                Order.objects.all(), fields).get(pk=pk)
+        except Order.DoesNotExist:
+            raise Http404
+        if wants(fields, 'cart_total'):
+            order.get_cart_total()
+        if wants(fields, 'order_items'):
+            load_cart_products([order])
 
-        serializer = self.serializer_class(order)
+        serializer = self.serializer_class(order, fields=fields)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -386,6 +504,41 @@ class AdminOrderDetail(APIView):
         return Response({'msg': 'Delelte Successfull'}, status=status.HTTP_204_NO_CONTENT)
 
 
+class OrderEventFeed(APIView):
+    """
+    Order status changes, oldest first, for consumers tailing the log.
+
+    Pass the ``next`` value of the previous response as ``since`` to get
+    only newer events; ``next`` is returned even when there are none.
+    ``order_id`` narrows the feed to the timeline of one order.
+
+    The ``since`` cursor assumes events commit in id order, which holds
+    while the database has a single writer at a time, as SQLite does.
+    With concurrent writers (e.g. PostgreSQL) an event whose transaction
+    commits after a higher id was served would be skipped for good.
+    """
+    permission_classes = [IsAdminUser]
+
+    serializer_class = OrderEventSerializer
+
+    def get(self, request, format=None):
+        params = request.query_params
+        since = parse_id('since', params['since']) if params.get(
+            'since') else 0
+        events = OrderEvent.objects.filter(id__gt=since)
+        if params.get('order_id'):
+            events = events.filter(
+                order_id=parse_id('order_id', params['order_id']))
+        page_size = get_page_size(request, default=100, maximum=500)
+        events = list(events.order_by('id')[:page_size])
+        serializer = self.serializer_class(events, many=True)
+
+        return Response({
+            'events': serializer.data,
+            'next': events[-1].id if events else since,
+        }, status=status.HTTP_200_OK)
+
+
 class TagProductList(APIView):
     """View for Tag Product Connector."""
 
@@ -396,6 +549,10 @@ class TagProductList(APIView):
 
     def get(self, request, format=None):
         product_tags = ProductTagConnector.objects.filter()
+        if is_stream_request(request):
+            return streaming_json_response(
+                product_tags.order_by('id'), TagProductConnectorSerializer,
+                request)
         serializer = TagProductConnectorSerializer(product_tags, many=True)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -136,20 +136,49 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'core.throttling.AnonRateThrottle',
+        'core.throttling.UserRateThrottle',
+        'core.throttling.ScopedRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        'place_order': '10/min',
+        'signup': '20/hour',
     },
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ),
     # 'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     # 'PAGE_SIZE': 5
 }
 
+# The dicts below are optional and only need the keys that change a
+# default; the defaults are the DEFAULTS of the module named with each.
+#
+# CATALOG_CACHE: response cache of the public catalog endpoints, see
+# store/catalog_cache.py. SHARED_CACHE names a CACHES alias (e.g. redis)
+# shared by all workers.
+#
+# CART_STORE: write-behind cart store, see store/cart_store.py. Cart
+# updates are kept in the cache and flushed to the database in batches.
+# Run `manage.py flush_carts` periodically. Enabling it requires CACHE to
+# name a CACHES alias (e.g. redis) shared by all workers.
+#
+# IDEMPOTENCY: responses stored for replays of requests sent with an
+# Idempotency-Key, see core/idempotency.py.
+#
+# THROTTLING: throttle counters shared by all workers, see
+# core/throttling.py. They are kept in a SQLite file at PATH (default
+# BASE_DIR / 'throttle.sqlite3') unless CACHE names a CACHES alias (e.g.
+# redis) to keep them in.
+#
+# AUTH_CACHE: users and customers resolved from JWTs are cached per worker
+# for TIMEOUT seconds, see core/authentication.py.
+#
+# PRODUCT_RENDITIONS: renditions of uploaded product images are created
+# eagerly by WORKERS background threads, see store/renditions.py.
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Django Sample Ecommerce',
     'DESCRIPTION': 'Your project description',
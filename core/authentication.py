@@ -0,0 +1,92 @@
+"""
+JWT authentication with an in-process cache of users.
+
+``JWTAuthentication`` loads the user of every request from the database
+and views then load its customer with a second query.
+``CachedJWTAuthentication`` keeps both, fetched with one
+``select_related`` query, in a bounded LRU keyed by the ``user_id`` claim.
+
+Saving or deleting a ``User`` or ``Customer`` drops the entry (see
+``core.signals``). Every worker keeps its own cache, so changes made in
+another process or with ``QuerySet.update()`` are seen once the entry
+expires after ``TIMEOUT`` seconds.
+"""
+import copy
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+from core.cache import LRUCache
+from core.conf import setting_getter
+
+
+DEFAULTS = {
+    'MAX_ENTRIES': 4096,
+    'TIMEOUT': 60,
+}
+
+
+get_setting = setting_getter('AUTH_CACHE', DEFAULTS)
+
+
+_users = LRUCache(
+    max_entries=get_setting('MAX_ENTRIES'), ttl=get_setting('TIMEOUT'))
+
+
+def invalidate_user(user_id):
+    """Forget the cached user with ``user_id``."""
+    _users.delete(str(user_id))
+
+
+def clear_user_cache():
+    """Forget every cached user."""
+    _users.clear()
+
+
+def _clone(user):
+    """
+    Return a copy of a cached user and its customer.
+
+    Requests may change the instances they are handed, so the cached ones
+    are never given out.
+    """
+    user = copy.copy(user)
+    customer = user._state.fields_cache.get('customer')
+    if customer is not None:
+        customer = copy.copy(customer)
+        customer._state.fields_cache['user'] = user
+        user._state.fields_cache['customer'] = customer
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` resolving users and customers from a cache."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification'))
+
+        key = str(user_id)
+        user = _users.get(key)
+        if user is None:
+            try:
+                user = self.user_model.objects.select_related(
+                    'customer').get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(
+                    _('User not found'), code='user_not_found')
+            _users.set(key, user)
+
+        if not user.is_active:
+            raise AuthenticationFailed(
+                _('User is inactive'), code='user_inactive')
+
+        return _clone(user)
@@ -0,0 +1,102 @@
+"""
+Caching helpers.
+"""
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+
+_missing = object()
+
+
+class LRUCache:
+    """
+    A small thread-safe LRU cache with an optional per-entry TTL.
+
+    Entries are evicted least recently used first once ``max_entries`` is
+    reached. ``ttl`` is in seconds; ``None`` keeps entries until evicted.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value stored for ``key`` or ``default``."""
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                return default
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store ``value`` under ``key``, evicting old entries if needed."""
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Remove ``key`` if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+
+def detach(data):
+    """
+    Return ``data`` as plain lists and dicts.
+
+    DRF's returned data keeps a reference to its serializer, which makes
+    it expensive to cache and impossible to pickle.
+    """
+    if isinstance(data, list):
+        return [detach(item) for item in data]
+    if isinstance(data, dict):
+        return {key: detach(value) for key, value in data.items()}
+    return data
+
+
+def shared_cache(alias, setting):
+    """
+    Return the cache ``alias``, which must be shared by every worker.
+
+    Refuses per-process backends such as ``LocMemCache``: state kept
+    there is invisible to the other workers and culled once the cache
+    fills up. ``setting`` names the setting in the error message.
+    """
+    if not alias:
+        raise ImproperlyConfigured(
+            f'{setting} must name a CACHES alias shared by all workers.')
+    cache = caches[alias]
+    if isinstance(cache, (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            f'{setting} names {alias!r}, a per-process cache; use a cache '
+            f'shared by all workers such as redis or memcached.')
+    return cache
@@ -0,0 +1,45 @@
+"""
+Conditional GET helpers.
+
+Views derive a strong ETag from a cheap version stamp and compare it with
+``If-None-Match`` before running any serializer, answering
+``304 Not Modified`` with an empty body when the client is up to date.
+"""
+import hashlib
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(request, *parts):
+    """
+    Return a quoted strong ETag for ``parts``.
+
+    The negotiated response format is part of the tag, so the JSON and
+    browsable renderings never share one.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    media_type = getattr(renderer, 'media_type', '')
+    raw = repr((media_type,) + parts)
+    return '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+
+
+def not_modified(request, etag):
+    """Return a 304 response if ``If-None-Match`` matches ``etag``."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return None
+    etags = parse_etags(header)
+    if '*' in etags or etag in etags:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response, etag):
+    """Attach ``etag`` to ``response``."""
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Accept',))
+    return response
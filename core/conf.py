@@ -0,0 +1,21 @@
+"""
+Access to the project's optional settings dicts.
+"""
+from django.conf import settings
+
+
+def setting_getter(setting, defaults):
+    """
+    Return a ``get_setting(name)`` function for the settings dict ``setting``.
+
+    Keys left out of the dict, or the whole dict left out of the project
+    settings, fall back to ``defaults``. The dict is read on every call, so
+    ``override_settings`` applies.
+    """
+
+    def get_setting(name):
+        return getattr(settings, setting, {}).get(name, defaults[name])
+
+    get_setting.__doc__ = (
+        f'Return a ``{setting}`` setting, falling back to the default.')
+    return get_setting
@@ -0,0 +1,108 @@
+"""
+Compiled read-only path for list serialization.
+
+DRF's generic ``Serializer.to_representation`` walks every field through
+``Field.get_attribute`` for each object, resolving ``source_attrs`` one by
+one and checking for callables, mappings and ``SkipField`` along the way.
+For list endpoints that dispatch dominates CPU time.
+
+``CompiledListSerializer`` compiles the readable fields of its child
+serializer once per field set into a flat plan of C-level attribute
+getters. Each object is then serialized by running the plan. Anything the
+plan cannot handle exactly like DRF, such as callables, ``source='*'``,
+related fields and lookup errors, falls back to the field's own
+``get_attribute`` for that value, so the output is identical.
+
+Enable it on a serializer with::
+
+    class Meta:
+        list_serializer_class = CompiledListSerializer
+"""
+from collections import OrderedDict
+from operator import attrgetter
+
+from django.db import models
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject, RelatedField
+
+
+_plans = {}
+
+
+def _compile(serializer, fields):
+    """Return ``(field_name, getter)`` pairs for ``fields``."""
+    key = (type(serializer), tuple(field.field_name for field in fields))
+    plan = _plans.get(key)
+    if plan is None:
+        plan = []
+        for field in fields:
+            getter = None
+            simple = (
+                field.source != '*'
+                and not isinstance(field, RelatedField)
+                and all(attr.isidentifier() for attr in field.source_attrs)
+            )
+            if simple:
+                getter = attrgetter('.'.join(field.source_attrs))
+            plan.append((field.field_name, getter))
+        _plans[key] = plan
+    return plan
+
+
+def compile_serializer(serializer):
+    """
+    Return a function serializing one instance like
+    ``serializer.to_representation``.
+    """
+    if (type(serializer).to_representation
+            is not serializers.Serializer.to_representation):
+        return serializer.to_representation
+
+    fields = list(serializer._readable_fields)
+    steps = [
+        (name, field, getter, field.to_representation)
+        for field, (name, getter) in zip(fields, _compile(serializer, fields))
+    ]
+
+    def represent(instance):
+        ret = OrderedDict()
+        for name, field, getter, to_representation in steps:
+            try:
+                if getter is None:
+                    attribute = field.get_attribute(instance)
+                else:
+                    try:
+                        attribute = getter(instance)
+                    except Exception:
+                        attribute = field.get_attribute(instance)
+                    else:
+                        if callable(attribute):
+                            attribute = field.get_attribute(instance)
+            except SkipField:
+                continue
+
+            if isinstance(attribute, PKOnlyObject):
+                check_for_none = attribute.pk
+            else:
+                check_for_none = attribute
+            if check_for_none is None:
+                ret[name] = None
+            else:
+                ret[name] = to_representation(attribute)
+        return ret
+
+    return represent
+
+
+class CompiledListSerializer(serializers.ListSerializer):
+    """``ListSerializer`` that serializes its items with a compiled plan."""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        # Nested list fields are shared by every parent object, so the
+        # plan is bound once per list serializer instance.
+        represent = getattr(self, '_represent', None)
+        if represent is None:
+            represent = self._represent = compile_serializer(self.child)
+        return [represent(item) for item in iterable]
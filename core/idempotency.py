@@ -0,0 +1,145 @@
+"""
+``Idempotency-Key`` support for unsafe endpoints.
+
+A client retrying a POST sends the same ``Idempotency-Key`` header. The
+first request runs the view and its response is stored under the key;
+replays get the stored response back without running the view again,
+marked with an ``Idempotent-Replayed: true`` header.
+
+Keys are scoped to the user and the endpoint, and stored in the
+``IdempotencyKey`` table, so a retry reaching any worker is recognised.
+The first request claims its key by inserting the row, which the unique
+key makes atomic. Rows older than ``TIMEOUT`` seconds are ignored and
+pruned now and then. A replay with a different body is rejected with
+422, and a replay arriving while the first request is still running
+gets 409; a claim older than ``LOCK_TIMEOUT`` seconds is taken to belong
+to a request that died and is taken over. Server errors are not stored,
+so the client can retry them.
+"""
+import functools
+import hashlib
+import json
+import random
+
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.conf import setting_getter
+from core.models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+
+MAX_KEY_LENGTH = 255
+
+DEFAULTS = {
+    'TIMEOUT': 24 * 60 * 60,
+    'LOCK_TIMEOUT': 30,
+}
+
+# One in this many claims also deletes expired keys.
+PRUNE_EVERY = 1000
+
+
+get_setting = setting_getter('IDEMPOTENCY', DEFAULTS)
+
+
+def _digest(*parts):
+    return hashlib.md5(
+        json.dumps(parts, cls=JSONEncoder, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def _expired(record, now):
+    age = now - record.created
+    if record.status is None:
+        return age > timedelta(seconds=get_setting('LOCK_TIMEOUT'))
+    return age > timedelta(seconds=get_setting('TIMEOUT'))
+
+
+def _claim(key, fingerprint):
+    """
+    Return ``(record, claimed)`` for the request stored under ``key``.
+
+    ``claimed`` is True when this request inserted ``record`` and has to
+    run the view.
+    """
+    now = timezone.now()
+    record = IdempotencyKey.objects.filter(key=key).first()
+    if record is not None and not _expired(record, now):
+        return record, False
+    if record is not None:
+        IdempotencyKey.objects.filter(
+            pk=record.pk, created=record.created).delete()
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                key=key, fingerprint=fingerprint)
+    except IntegrityError:
+        # A request with the same key got in first.
+        record = IdempotencyKey.objects.filter(key=key).first()
+        if record is None:
+            # ... and failed since; treat it as still running.
+            record = IdempotencyKey(key=key, fingerprint=fingerprint)
+        return record, False
+
+    if random.randrange(PRUNE_EVERY) == 0:
+        IdempotencyKey.objects.filter(created__lt=now - timedelta(
+            seconds=get_setting('TIMEOUT'))).delete()
+    return record, True
+
+
+def idempotent(method):
+    """Honor the ``Idempotency-Key`` header on an ``APIView`` method."""
+
+    @functools.wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'msg': f'{HEADER} must be at most {MAX_KEY_LENGTH} '
+                        'characters.'},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = _digest(request.data)
+        record, claimed = _claim(
+            _digest(request.user.pk, request.method, request.path, key),
+            fingerprint)
+
+        if claimed:
+            stored = IdempotencyKey.objects.filter(pk=record.pk)
+            try:
+                response = method(view, request, *args, **kwargs)
+            except Exception:
+                stored.delete()
+                raise
+            if response.status_code < 500:
+                stored.update(
+                    status=response.status_code,
+                    response=json.loads(
+                        json.dumps(response.data, cls=JSONEncoder)))
+            else:
+                stored.delete()
+            return response
+
+        if record.status is None:
+            return Response(
+                {'msg': 'A request with this key is in progress.'},
+                status=status.HTTP_409_CONFLICT)
+        if record.fingerprint != fingerprint:
+            return Response(
+                {'msg': f'{HEADER} was already used with another request.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        response = Response(record.response, status=record.status)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    return wrapper
@@ -0,0 +1,113 @@
+"""
+Django command to load test checkout under contention.
+
+Creates throwaway customers whose carts all hold the same products,
+places their orders from many threads at once, reports throughput and
+checks that no stock was oversold. Everything it creates is deleted
+afterwards.
+"""
+import random
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from core.models import (
+    Category, Customer, Order, OrderEvent, OrderItem, Product,
+)
+from store import checkout
+
+
+LOCK_WAIT = 60
+
+
+class Command(BaseCommand):
+    """Django command to benchmark concurrent checkouts."""
+
+    help = 'Load test concurrent checkouts and check for overselling.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--products', type=int, default=3)
+        parser.add_argument('--stock', type=int, default=100)
+
+    def _setup(self, options):
+        tag = uuid.uuid4().hex[:8]
+        category = Category.objects.create(name=f'bench-{tag}')
+        products = Product.objects.bulk_create([
+            Product(category=category, name=f'bench-{tag}-{index}',
+                    price=Decimal('10.00'), stock=options['stock'])
+            for index in range(options['products'])
+        ])
+        users = get_user_model().objects.bulk_create([
+            get_user_model()(email=f'bench-{tag}-{index}@example.com')
+            for index in range(options['customers'])
+        ])
+        customers = Customer.objects.bulk_create(
+            [Customer(user=user) for user in users])
+        orders = Order.objects.bulk_create(
+            [Order(customer=customer) for customer in customers])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1)
+            for order in orders for product in products
+        ])
+        return category, products, users, customers
+
+    def _place(self, customer):
+        try:
+            # SQLite serializes writers; a checkout that hit the lock was
+            # rolled back as a whole and is retried.
+            deadline = time.monotonic() + LOCK_WAIT
+            while True:
+                try:
+                    checkout.place_order(customer)
+                    return True
+                except OperationalError:
+                    if time.monotonic() > deadline:
+                        raise CommandError('Database stayed locked.')
+                    time.sleep(random.uniform(0, 0.005))
+        except checkout.InsufficientStock:
+            return False
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        category, products, users, customers = self._setup(options)
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(options['threads']) as executor:
+                results = list(executor.map(self._place, customers))
+            elapsed = time.perf_counter() - start
+
+            placed = sum(results)
+            stock = sorted(Product.objects.filter(
+                pk__in=[product.pk for product in products],
+            ).values_list('stock', flat=True))
+            expected = max(options['stock'] - placed, 0)
+            if placed > options['stock'] or stock != [expected] * len(stock):
+                raise CommandError(
+                    f'Oversold: {placed} orders placed, stock left {stock}.')
+
+            self.stdout.write(
+                f'{len(customers)} checkouts on {options["threads"]} threads '
+                f'in {elapsed:.2f} s: {placed} placed, '
+                f'{len(customers) - placed} out of stock.')
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(customers) / elapsed:.1f} checkouts/s, '
+                f'no stock oversold.'))
+        finally:
+            # Events are kept when their order is deleted, so drop them
+            # explicitly.
+            OrderEvent.objects.filter(
+                order__customer__in=customers).delete()
+            Order.objects.filter(customer__in=customers).delete()
+            get_user_model().objects.filter(
+                pk__in=[user.pk for user in users]).delete()
+            category.delete()
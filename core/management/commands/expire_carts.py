@@ -0,0 +1,71 @@
+"""
+Django command to expire abandoned carts.
+
+Deletes open orders whose last change is older than ``--days``, together
+with their lines and shipping addresses, in batches of ``--batch-size``
+orders. Each batch is its own transaction, so a run can be interrupted
+and simply started again; it resumes with the carts that are left.
+
+Carts hold no stock (it is taken at checkout), so nothing needs to be
+released. Carts with changes still pending in the cart store are kept;
+the store's cache is shared with the web workers, so this command sees
+the changes they recorded.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Order, OrderItem, ShippingAddress
+from store import cart_store
+
+
+class Command(BaseCommand):
+    """Django command to delete idle open orders."""
+
+    help = 'Delete open orders idle for longer than the given number of days.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=30)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--max-batches', type=int, default=None,
+            help='Stop after this many batches; run again to continue.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = Order.objects.filter(complete=False, updated__lt=cutoff)
+        if cart_store.is_enabled():
+            expired = expired.exclude(
+                customer__in=cart_store.pending_customer_ids(
+                    expired.values_list('customer_id', flat=True)))
+
+        if options['dry_run']:
+            self.stdout.write(
+                f'{expired.count()} cart(s) idle since before '
+                f'{cutoff:%Y-%m-%d %H:%M} would be expired.')
+            return
+
+        reclaimed = {Order: 0, OrderItem: 0, ShippingAddress: 0}
+        batches = 0
+        while options['max_batches'] is None or (
+                batches < options['max_batches']):
+            with transaction.atomic():
+                ids = list(expired.order_by('id').values_list(
+                    'id', flat=True)[:options['batch_size']])
+                if not ids:
+                    break
+                # Re-check the filter so a cart touched since the ids were
+                # read is kept.
+                total, per_model = expired.filter(pk__in=ids).delete()
+            batches += 1
+            for model in reclaimed:
+                reclaimed[model] += per_model.get(model._meta.label, 0)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Expired {reclaimed[Order]} cart(s) in {batches} batch(es): '
+            f'{reclaimed[OrderItem]} order line(s) and '
+            f'{reclaimed[ShippingAddress]} shipping address(es) deleted.'))
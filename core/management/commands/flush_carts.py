@@ -0,0 +1,17 @@
+"""
+Django command to flush pending cart changes to the database.
+"""
+from django.core.management.base import BaseCommand
+
+from store import cart_store
+
+
+class Command(BaseCommand):
+    """Django command to flush the write-behind cart store."""
+
+    help = 'Write pending cart changes from the cart store to the database.'
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        flushed = cart_store.flush_all()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} cart(s).'))
@@ -0,0 +1,225 @@
+"""
+Django command to bulk import users and their customers.
+
+Reads a CSV file with a header row or a JSONL file (one object per line)
+with ``email``, ``password`` and optionally ``name`` and
+``phone_number``. Records are streamed, so files of any size are read in
+constant memory.
+
+Passwords are hashed with the configured hasher in a pool of
+``--workers`` processes, the next batch being hashed while the current
+one is written. Each batch of users and customers is inserted with
+``bulk_create`` in its own transaction, after which the number of
+records done is saved to the checkpoint file. An interrupted import is
+resumed from there by running the command again; users whose email
+already exists are skipped, so a batch written just before a crash is
+not imported twice.
+"""
+import csv
+import json
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from core.models import Customer
+
+
+def read_records(path, format):
+    """Yield the records of a CSV or JSONL file as dicts."""
+    with open(path, newline='', encoding='utf-8') as source:
+        if format == 'csv':
+            yield from csv.DictReader(source)
+            return
+        for number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise CommandError(f'Line {number} is not valid JSON.')
+
+
+def batched(records, size):
+    """Yield lists of up to ``size`` records."""
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+FIELDS = ('email', 'password', 'name', 'phone_number')
+
+
+def clean(record):
+    """Return the user fields of ``record``, or None if it is invalid."""
+    if not isinstance(record, dict):
+        return None
+    values = {field: record.get(field) or '' for field in FIELDS}
+    # JSONL values may be numbers, lists...; only strings are accepted.
+    if not all(isinstance(value, str) for value in values.values()):
+        return None
+    email = values['email'].strip()
+    password = values['password']
+    name = values['name'].strip()
+    phone_number = values['phone_number'].strip() or None
+    try:
+        validate_email(email)
+    except ValidationError:
+        return None
+    if not password or len(name) > 255 or len(phone_number or '') > 15:
+        return None
+    return {
+        'email': get_user_model().objects.normalize_email(email),
+        'password': password,
+        'name': name,
+        'phone_number': phone_number,
+    }
+
+
+class Command(BaseCommand):
+    """Django command to import users from a file."""
+
+    help = 'Bulk import users and customers from a CSV or JSONL file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Password hashing processes; 0 hashes in this process.')
+        parser.add_argument(
+            '--checkpoint',
+            help='Progress file; defaults to PATH.checkpoint.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Ignore the checkpoint and start from the first record.')
+
+    def _read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint) as source:
+                return json.load(source)['records']
+        except FileNotFoundError:
+            return 0
+        except (ValueError, KeyError):
+            raise CommandError(f'Unreadable checkpoint {checkpoint}.')
+
+    def _write_checkpoint(self, checkpoint, records):
+        # Replace the file atomically so a crash never leaves it half
+        # written.
+        partial = f'{checkpoint}.tmp'
+        with open(partial, 'w') as target:
+            json.dump({'records': records}, target)
+        os.replace(partial, checkpoint)
+
+    def _hashed(self, batches, pool):
+        """
+        Yield ``(batch, hashes)``, hashing the next batch meanwhile.
+
+        ``hashes`` has one password hash per valid record of ``batch``.
+        """
+        hashing = None
+        for batch in batches:
+            passwords = [
+                record['password'] for record in batch if record is not None]
+            if pool is None:
+                hashes = map(make_password, passwords)
+            else:
+                hashes = pool.map(
+                    make_password, passwords,
+                    chunksize=max(1, len(passwords) // (4 * self.workers)))
+            if hashing is not None:
+                yield hashing[0], list(hashing[1])
+            hashing = (batch, hashes)
+        if hashing is not None:
+            yield hashing[0], list(hashing[1])
+
+    def _insert(self, batch, hashes):
+        """
+        Insert the valid records of one batch.
+
+        Returns the number of users created; records whose email already
+        exists, in the database or earlier in the batch, are skipped.
+        """
+        User = get_user_model()
+        rows = {}
+        valid = [record for record in batch if record is not None]
+        for record, password in zip(valid, hashes):
+            rows.setdefault(record['email'], (record, password))
+
+        with transaction.atomic():
+            existing = set(User.objects.filter(
+                email__in=rows).values_list('email', flat=True))
+            new = {
+                email: row for email, row in rows.items()
+                if email not in existing
+            }
+            User.objects.bulk_create([
+                User(email=email, name=record['name'], password=password)
+                for email, (record, password) in new.items()
+            ], ignore_conflicts=True)
+            # Users created by a concurrent signup already have a customer.
+            user_ids = dict(User.objects.filter(
+                email__in=new, customer__isnull=True,
+            ).values_list('email', 'id'))
+            Customer.objects.bulk_create([
+                Customer(user_id=user_id, name=new[email][0]['name'],
+                         phone_number=new[email][0]['phone_number'])
+                for email, user_id in user_ids.items()
+            ])
+        return len(user_ids)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        path = options['path']
+        format = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl')
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        done = 0 if options['restart'] else self._read_checkpoint(checkpoint)
+        self.workers = max(0, options['workers'] or 0)
+        if done:
+            self.stdout.write(f'Resuming after {done} record(s).')
+
+        records = islice(read_records(path, format), done, None)
+        batches = batched(records, max(1, options['batch_size']))
+        created = skipped = invalid = batch_count = 0
+        pool = None
+        if self.workers:
+            pool = ProcessPoolExecutor(
+                self.workers, initializer=django.setup)
+        try:
+            for batch, hashes in self._hashed(
+                    ([clean(record) for record in batch]
+                     for batch in batches), pool):
+                count = self._insert(batch, hashes)
+                valid = sum(record is not None for record in batch)
+                created += count
+                skipped += valid - count
+                invalid += len(batch) - valid
+                done += len(batch)
+                batch_count += 1
+                self._write_checkpoint(checkpoint, done)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} user(s) in {batch_count} batch(es); '
+            f'{skipped} already existed and {invalid} invalid record(s) '
+            f'were skipped.'))
@@ -0,0 +1,38 @@
+"""
+Django command to initialise the stock of products that have none.
+
+Checkout only places orders whose products have enough stock, and
+products created before stock was tracked all have a stock of 0. Run
+this once when rolling out stock reservation, before customers check
+out, then keep stock up to date through the admin product API.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Product
+from store.catalog_cache import bump_catalog_version
+
+
+class Command(BaseCommand):
+    """Django command to set the stock of products with none."""
+
+    help = 'Set the stock of every product whose stock is 0.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('quantity', type=int)
+        parser.add_argument(
+            '--category', type=int,
+            help='Only initialise the products of this category id.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['quantity'] < 1:
+            raise CommandError('quantity must be at least 1.')
+        products = Product.objects.filter(stock=0)
+        if options['category'] is not None:
+            products = products.filter(category_id=options['category'])
+
+        updated = products.update(stock=options['quantity'])
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Initialised the stock of {updated} product(s) to '
+            f'{options["quantity"]}.'))
@@ -0,0 +1,27 @@
+"""
+Django command to update the sales rollups.
+"""
+from django.core.management.base import BaseCommand
+
+from admin_user.rollups import rebuild_rollups, update_rollups
+
+
+class Command(BaseCommand):
+    """Django command to fold completed orders into the sales rollups."""
+
+    help = ('Add orders completed since the last run to the hourly and '
+            'daily sales rollups. Meant to run every few minutes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Drop the rollups and compute them from all orders.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['rebuild']:
+            orders, windows = rebuild_rollups()
+        else:
+            orders, windows = update_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {orders} order(s) in {windows} window(s).'))
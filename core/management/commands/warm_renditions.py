@@ -0,0 +1,53 @@
+"""
+Django command to create the missing product image renditions.
+
+Every product image is handed to a pool of ``--workers`` processes, each
+creating the renditions of all configured key sets that are not stored
+yet, so running it again only does the work left over.
+"""
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+
+from django.core.management.base import BaseCommand
+
+from core.models import Product
+from store.renditions import size_keys, warm_image
+
+
+class Command(BaseCommand):
+    """Django command to pre-generate product image renditions."""
+
+    help = 'Create the missing renditions of every product image.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Resizing processes; 0 resizes in this process.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        names = Product.objects.exclude(image='').exclude(
+            image__isnull=True).values_list('image', flat=True).distinct()
+        names = names.order_by('image').iterator()
+
+        totals = [0, 0, 0]
+        images = 0
+        workers = max(0, options['workers'] or 0)
+        if workers:
+            with ProcessPoolExecutor(
+                    workers, initializer=django.setup) as pool:
+                results = list(pool.map(warm_image, names, chunksize=8))
+        else:
+            results = map(warm_image, names)
+        for counts in results:
+            images += 1
+            totals = [total + count for total, count in zip(totals, counts)]
+
+        created, present, failed = totals
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {len(size_keys())} rendition(s) of {images} image(s): '
+            f'{created} created, {present} already present, '
+            f'{failed} failed.'))
@@ -0,0 +1,54 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:23
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    """Merge duplicate open orders and duplicate order lines."""
+    Order = apps.get_model('core', 'Order')
+    OrderItem = apps.get_model('core', 'OrderItem')
+    ShippingAddress = apps.get_model('core', 'ShippingAddress')
+
+    duplicated = (
+        Order.objects.filter(complete=False)
+        .values('customer').annotate(count=Count('id'), keep=Min('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicated:
+        extra = Order.objects.filter(
+            customer=row['customer'], complete=False).exclude(pk=row['keep'])
+        OrderItem.objects.filter(order__in=extra).update(order=row['keep'])
+        ShippingAddress.objects.filter(order__in=extra).update(
+            order=row['keep'])
+        extra.delete()
+
+    duplicated = (
+        OrderItem.objects.values('order', 'product')
+        .annotate(count=Count('id'), keep=Min('id'), total=Sum('quantity'))
+        .filter(count__gt=1)
+    )
+    for row in duplicated:
+        OrderItem.objects.filter(pk=row['keep']).update(quantity=row['total'])
+        OrderItem.objects.filter(
+            order=row['order'], product=row['product'],
+        ).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_product_category_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('complete', False)), fields=('customer',), name='unique_open_order_per_customer'),
+        ),
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(fields=('order', 'product'), name='unique_order_product'),
+        ),
+    ]
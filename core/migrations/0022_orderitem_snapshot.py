@@ -0,0 +1,58 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def snapshot_placed_orders(apps, schema_editor):
+    """
+    Freeze lines and totals of orders placed before snapshots existed.
+
+    Their original prices are unknown, so current prices are used.
+    """
+    Order = apps.get_model('core', 'Order')
+    OrderItem = apps.get_model('core', 'OrderItem')
+
+    lines = OrderItem.objects.filter(
+        order__complete=True, product_name='').select_related('product')
+    batch = []
+    for line in lines.iterator(chunk_size=BATCH_SIZE):
+        product = line.product
+        if product.discounted_price < 1:
+            line.item_price = product.price
+        else:
+            line.item_price = product.discounted_price
+        line.product_name = product.name
+        batch.append(line)
+        if len(batch) >= BATCH_SIZE:
+            OrderItem.objects.bulk_update(
+                batch, ['item_price', 'product_name'])
+            batch = []
+    OrderItem.objects.bulk_update(batch, ['item_price', 'product_name'])
+
+    orders = Order.objects.filter(complete=True, cart_total=0)
+    for order in orders.iterator(chunk_size=BATCH_SIZE):
+        order.cart_total = sum(
+            line.item_price * line.quantity
+            for line in OrderItem.objects.filter(order=order))
+        if order.cart_total:
+            order.save(update_fields=['cart_total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_cart_uniqueness'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.RunPython(
+            snapshot_placed_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_orderitem_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['complete', 'updated', 'id'], name='order_complete_updated_idx'),
+        ),
+    ]
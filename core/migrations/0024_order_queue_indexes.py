@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_order_complete_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['complete', 'date_ordered', 'id'], name='order_complete_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['complete', 'order_status', 'date_ordered', 'id'], name='order_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'date_ordered', 'id'], name='order_customer_date_idx'),
+        ),
+    ]
@@ -2,10 +2,15 @@
 Database models
 """
 
+from decimal import Decimal
+
 from versatileimagefield.fields import VersatileImageField
 from django.conf import settings
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import (
+    Case, F, OuterRef, Q, Subquery, Sum, Value, When)
+from django.db.models.functions import Coalesce, Round
 
 from django.contrib.auth.models import (
     AbstractBaseUser,
@@ -75,6 +80,57 @@ class Tag(models.Model):
         return self.title
 
 
+class ProductQuerySet(models.QuerySet):
+    """QuerySet for products."""
+
+    def with_tags(self):
+        """Prefetch the tags serialized by ``ProductSerializer``."""
+        return self.prefetch_related(models.Prefetch(
+            'producttagconnector_set',
+            queryset=ProductTagConnector.objects.select_related('tag'),
+        ))
+
+    def apply_discount(self, percentage, chunk_size=None, progress=None):
+        """
+        Set ``discount`` and ``discounted_price`` from a percentage.
+
+        This is the set-based equivalent of ``Product.calculate_discount``
+        followed by ``save()``. Without ``chunk_size`` every product is
+        updated by one UPDATE statement; otherwise products are updated in
+        primary key chunks of that size, each in its own transaction, and
+        ``progress(done, total)`` is called after every chunk. A callable
+        ``percentage`` is called in every chunk's transaction, so a long
+        update follows a percentage that changes while it runs. Returns the
+        number of updated products.
+        """
+        def discounted(percentage):
+            discount = Round(
+                F('price') * Value(Decimal(percentage) / 100), 2)
+            return {
+                'discount': discount,
+                'discounted_price': F('price') - discount,
+            }
+
+        current = percentage if callable(percentage) else lambda: percentage
+
+        if chunk_size is None:
+            with transaction.atomic():
+                return self.update(**discounted(current()))
+
+        product_ids = list(
+            self.order_by('pk').values_list('pk', flat=True))
+        total = len(product_ids)
+        done = 0
+        for start in range(0, total, chunk_size):
+            chunk = product_ids[start:start + chunk_size]
+            with transaction.atomic():
+                done += Product.objects.filter(pk__in=chunk).update(
+                    **discounted(current()))
+            if progress is not None:
+                progress(done, total)
+        return done
+
+
 class Product(models.Model):
     """Our Product Database Model."""
     category = models.ForeignKey(
@@ -91,6 +147,17 @@ class Product(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     # tags = models.ManyToManyField(Tag, blank=True)
 
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Backs keyset pagination of the product lists.
+            models.Index(fields=['created', 'id'],
+                         name='product_created_id_idx'),
+            models.Index(fields=['category', 'created', 'id'],
+                         name='product_category_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name}"
 
@@ -115,6 +182,19 @@ class ProductTagConnector(models.Model):
         return f"{self.tag.title} {self.product.name}"
 
 
+class CatalogVersion(models.Model):
+    """
+    The version of the public catalog responses.
+
+    A single row whose ``version`` is replaced with a random token by
+    every catalog write, see ``store.catalog_cache``.
+    """
+    version = models.CharField(max_length=32)
+
+    def __str__(self):
+        return self.version
+
+
 class Customer(models.Model):
     """Model for Customer."""
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -125,12 +205,95 @@ class Customer(models.Model):
         return f"{self.name}"
 
 
+def order_item_total(prefix=''):
+    """
+    Return an expression for the price of an order line.
+
+    Mirrors ``OrderItem.get_total``: a ``discounted_price`` below 1 means
+    the product is not discounted and the regular price applies.
+    ``prefix`` is the lookup path from the queried model to ``OrderItem``.
+    """
+    price = F(f'{prefix}product__price')
+    discounted_price = F(f'{prefix}product__discounted_price')
+    quantity = F(f'{prefix}quantity')
+    return Case(
+        When(**{f'{prefix}product__discounted_price__lt': 1},
+             then=price * quantity),
+        default=discounted_price * quantity,
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def cart_total(prefix=''):
+    """Return an expression summing ``order_item_total`` over a cart."""
+    return Coalesce(
+        Sum(order_item_total(prefix)),
+        Value(0),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+class OrderQuerySet(models.QuerySet):
+    """QuerySet for orders."""
+
+    def open_for(self, customer):
+        """
+        Return the customer's open order, creating it if needed.
+
+        One open order per customer is enforced by a unique constraint, so
+        a concurrent create fails and ``get_or_create`` returns the winner.
+        """
+        order, created = self.get_or_create(customer=customer, complete=False)
+        return order
+
+    def with_cart_total(self):
+        """
+        Annotate each order with its cart total as ``order_total``.
+
+        Placed orders use the frozen ``cart_total``; only open orders are
+        summed from their lines, in a correlated subquery.
+        """
+        live_total = OrderItem.objects.filter(
+            order=OuterRef('pk'),
+        ).values('order').annotate(total=cart_total()).values('total')
+        return self.annotate(order_total=Case(
+            When(complete=True, then=F('cart_total')),
+            default=Coalesce(Subquery(live_total), Value(0)),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ))
+
+    def with_items(self):
+        """
+        Prefetch order lines.
+
+        Lines of placed orders are read from their snapshot columns, so
+        products are not loaded here; see ``load_cart_products``.
+        """
+        return self.prefetch_related('order_items')
+
+
+def load_cart_products(orders):
+    """
+    Load the products of the open orders' lines in one query.
+
+    ``orders`` must have their lines prefetched with ``with_items``.
+    """
+    lines = [
+        line
+        for order in orders if not order.complete
+        for line in order.order_items.all()
+    ]
+    models.prefetch_related_objects(lines, 'product')
+
+
 class Order(models.Model):
     """Our Order Model."""
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
 
     date_ordered = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
     complete = models.BooleanField(default=False)
+    completed_at = models.DateTimeField(null=True, blank=True, db_index=True)
     cart_total = models.DecimalField(
         max_digits=10, decimal_places=2, default=0)
     paid_amount = models.DecimalField(
@@ -146,18 +309,124 @@ class Order(models.Model):
     order_status = models.CharField(
         choices=choice, default='Pending', max_length=20)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['customer'], condition=Q(complete=False),
+                name='unique_open_order_per_customer'),
+        ]
+        indexes = [
+            models.Index(fields=['complete', 'updated', 'id'],
+                         name='order_complete_updated_idx'),
+            models.Index(fields=['complete', 'date_ordered', 'id'],
+                         name='order_complete_date_idx'),
+            models.Index(fields=['complete', 'order_status', 'date_ordered',
+                                 'id'],
+                         name='order_status_date_idx'),
+            models.Index(fields=['customer', 'date_ordered', 'id'],
+                         name='order_customer_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.id}"
 
     def get_cart_total(self):
-        """Calculate total order price"""
-        # orderitems = self.orderitem_set.all()
-        orderitems = self.order_items.all()
-        total = sum([item.get_total() for item in orderitems])
+        """
+        Calculate total order price.
+
+        Placed orders return the total frozen at checkout. For the open
+        order, orders fetched with ``Order.objects.with_cart_total()``
+        already carry the total, otherwise it is computed with one
+        aggregate query.
+        """
+        if self.complete:
+            return self.cart_total
+        total = getattr(self, 'order_total', None)
+        if total is None:
+            total = self.order_items.aggregate(
+                total=cart_total())['total']
         self.cart_total = total
         return total
 
 
+class OrderItemQuerySet(models.QuerySet):
+    """QuerySet for order lines."""
+
+    def adjust_quantity(self, order, product_id, delta):
+        """
+        Add ``delta`` to the quantity of a product in ``order``.
+
+        The change is applied with a single ``UPDATE ... SET quantity =
+        quantity + delta`` so concurrent adjustments never overwrite each
+        other. A missing line is created for a positive delta; if another
+        request creates it first the unique constraint on ``(order,
+        product)`` rejects the insert and the update is retried. Lines
+        left at zero or below are deleted.
+        """
+        if not delta:
+            return
+        lines = self.filter(order=order, product_id=product_id)
+        with transaction.atomic():
+            updated = lines.update(quantity=F('quantity') + delta)
+            if not updated:
+                if delta < 0:
+                    return
+                try:
+                    with transaction.atomic():
+                        self.create(
+                            order=order, product_id=product_id,
+                            quantity=delta)
+                    return
+                except IntegrityError:
+                    lines.update(quantity=F('quantity') + delta)
+            lines.filter(quantity__lte=0).delete()
+
+    def apply_quantities(self, order, quantities, absolute=True):
+        """
+        Apply ``{product_id: quantity}`` to the lines of ``order``.
+
+        With ``absolute`` the quantities replace the current ones,
+        otherwise they are added to them with ``F()`` expressions. Runs
+        in one transaction with a fixed number of queries however many
+        products are given. Lines left at zero or below are deleted.
+        """
+        if not quantities:
+            return
+        lines = self.filter(order=order, product_id__in=quantities)
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    existing = {
+                        item.product_id: item
+                        for item in lines.only('id', 'product_id')
+                    }
+                    to_create, to_update = [], []
+                    for product_id, quantity in quantities.items():
+                        item = existing.get(product_id)
+                        if item is None:
+                            if quantity > 0:
+                                to_create.append(self.model(
+                                    order=order, product_id=product_id,
+                                    quantity=quantity))
+                            continue
+                        if absolute:
+                            item.quantity = quantity
+                        else:
+                            item.quantity = F('quantity') + quantity
+                        to_update.append(item)
+                    self.bulk_create(to_create)
+                    self.bulk_update(to_update, ['quantity'])
+                    lines.filter(quantity__lte=0).delete()
+                return
+            except IntegrityError:
+                # A concurrent request created one of the lines; the
+                # second attempt sees it and updates it instead.
+                if attempt:
+                    raise
+
+
 class OrderItem(models.Model):
     """Model for storing order Items."""
     order = models.ForeignKey(
@@ -166,17 +435,49 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=0)
     date_added = models.DateTimeField(auto_now_add=True)
+    # Unit price and product name frozen when the order is placed.
     item_price = models.DecimalField(
         max_digits=10, decimal_places=2, default=0)
+    product_name = models.CharField(max_length=100, blank=True)
+
+    objects = OrderItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['order', 'product'], name='unique_order_product'),
+        ]
 
     def __str__(self):
         return f'{self.id}'
 
+    @property
+    def is_snapshot(self):
+        """True when the line belongs to a placed order."""
+        return self.order.complete
+
+    @property
+    def name(self):
+        """Return the product name, frozen once the order is placed."""
+        return self.product_name if self.is_snapshot else self.product.name
+
+    @property
+    def unit_price(self):
+        """Return the unit price, frozen once the order is placed."""
+        if self.is_snapshot:
+            return self.item_price
+        if self.product.discounted_price < 1:
+            return self.product.price
+        return self.product.discounted_price
+
+    def freeze(self):
+        """Copy the current product name and price onto the line."""
+        self.item_price = self.unit_price
+        self.product_name = self.product.name
+
     def get_total(self):
         """Calculate and return total price."""
-        if self.product.discounted_price < 1:
-            return self.product.price * self.quantity
-        return self.product.discounted_price * self.quantity
+        return self.unit_price * self.quantity
 
 
 class ShippingAddress(models.Model):
@@ -189,3 +490,153 @@ class ShippingAddress(models.Model):
 
     def __str__(self):
         return f'{self.address}'
+
+
+ROLLUP_PERIODS = (
+    ('hour', 'Hour'),
+    ('day', 'Day'),
+)
+
+
+class SalesRollup(models.Model):
+    """Revenue, orders and units sold in one hour or day."""
+    period = models.CharField(choices=ROLLUP_PERIODS, max_length=4)
+    bucket = models.DateTimeField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'bucket'], name='unique_sales_rollup'),
+        ]
+
+    def __str__(self):
+        return f'{self.period} {self.bucket}'
+
+
+class ProductSalesRollup(models.Model):
+    """Units and revenue of one product in one hour or day."""
+    period = models.CharField(choices=ROLLUP_PERIODS, max_length=4)
+    bucket = models.DateTimeField()
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='+')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'bucket', 'product'],
+                name='unique_product_sales_rollup'),
+        ]
+
+    def __str__(self):
+        return f'{self.period} {self.bucket} {self.product_id}'
+
+
+class CategorySalesRollup(models.Model):
+    """Units and revenue of one category in one hour or day."""
+    period = models.CharField(choices=ROLLUP_PERIODS, max_length=4)
+    bucket = models.DateTimeField()
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, related_name='+')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'bucket', 'category'],
+                name='unique_category_sales_rollup'),
+        ]
+
+    def __str__(self):
+        return f'{self.period} {self.bucket} {self.category_id}'
+
+
+class RollupState(models.Model):
+    """How far a rollup has read its source rows."""
+    name = models.CharField(max_length=50, unique=True)
+    high_water = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name} {self.high_water}'
+
+
+class IdempotencyKey(models.Model):
+    """
+    A request sent with an ``Idempotency-Key`` and its stored response.
+
+    ``status`` is null while the first request with the key is running.
+    """
+    key = models.CharField(max_length=32, unique=True)
+    fingerprint = models.CharField(max_length=32)
+    status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.key} {self.status}'
+
+
+JOB_STATUSES = (
+    ('pending', 'Pending'),
+    ('running', 'Running'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+)
+
+
+class Job(models.Model):
+    """State of a background job started from the admin API."""
+    id = models.CharField(primary_key=True, max_length=32)
+    status = models.CharField(
+        choices=JOB_STATUSES, max_length=10, default='pending')
+    done = models.IntegerField(default=0)
+    total = models.IntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.id} {self.status}'
+
+
+class OrderEvent(models.Model):
+    """
+    A change of an order's status.
+
+    Events are only ever inserted, so the ``id`` gives their order and
+    serves as the cursor of the event feed. They are kept when the order
+    is deleted.
+    """
+    order = models.ForeignKey(
+        Order, on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='events')
+    from_status = models.CharField(
+        choices=Order.choice, max_length=20, blank=True)
+    to_status = models.CharField(choices=Order.choice, max_length=20)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'id'], name='order_event_order_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.order_id} {self.from_status} -> {self.to_status}'
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Order events cannot be changed.')
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def record(cls, order, from_status, to_status):
+        """Log a status change of ``order``; unchanged statuses are skipped."""
+        if from_status == to_status:
+            return None
+        return cls.objects.create(
+            order=order, from_status=from_status or '', to_status=to_status)
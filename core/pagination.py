@@ -0,0 +1,220 @@
+"""
+Pagination helpers shared by the store and admin list views.
+
+Two modes are supported:
+
+* ``page`` mode (the default) keeps the legacy ``page``/``pages`` response
+  built on top of Django's ``Paginator``.
+* ``cursor`` mode is keyset pagination. The cursor is an opaque token
+  encoding the ordering values of the last (or first) row that was sent,
+  so fetching any page costs one indexed range scan with no ``COUNT(*)``
+  and no ``OFFSET``.
+
+Cursor mode is selected with ``?pagination=cursor`` or by sending a
+``cursor`` query parameter.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import (
+    Paginator,
+    EmptyPage,
+    PageNotAnInteger,
+)
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+
+DEFAULT_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 100
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Return the requested page size clamped to ``[1, maximum]``."""
+    page_size = request.query_params.get('page_size')
+    if page_size is None:
+        return default
+    try:
+        page_size = int(page_size)
+    except ValueError:
+        raise ValidationError({'page_size': 'Must be an integer.'})
+
+    return max(1, min(page_size, maximum))
+
+
+def is_cursor_request(request):
+    """Return True when the client asked for keyset pagination."""
+    params = request.query_params
+    return params.get('pagination') == 'cursor' or 'cursor' in params
+
+
+def _encode_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is not None:
+            return parsed
+    return value
+
+
+def encode_cursor(values, direction):
+    """Encode ordering values and a direction into an opaque token."""
+    payload = {
+        'v': [_encode_value(value) for value in values],
+        'd': direction,
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, field_count):
+    """Decode a token produced by ``encode_cursor``."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_decode_value(value) for value in payload['v']]
+        direction = payload['d']
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+
+    if len(values) != field_count or direction not in ('next', 'prev'):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+
+    return values, direction
+
+
+def _keyset_filter(fields, values, forward):
+    """
+    Build the row-value comparison for a descending ordering.
+
+    ``forward`` selects rows after the cursor (smaller values), otherwise
+    rows before it (greater values). The expansion of
+    ``(a, b) < (x, y)`` into ``a < x OR (a = x AND b < y)`` lets the
+    database use a composite index on the ordering fields.
+    """
+    lookup = 'lt' if forward else 'gt'
+    condition = Q()
+    for index, field in enumerate(fields):
+        clause = Q(**{f'{field}__{lookup}': values[index]})
+        for previous, value in zip(fields[:index], values[:index]):
+            clause &= Q(**{previous: value})
+        condition |= clause
+    return condition
+
+
+class CursorPage:
+    """A page of results fetched with keyset pagination."""
+
+    def __init__(self, object_list, next_cursor, prev_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def paginate_by_cursor(queryset, request, ordering=('created', 'id'),
+                       page_size=None):
+    """
+    Return a ``CursorPage`` for ``queryset`` ordered descending by
+    ``ordering``.
+    """
+    if page_size is None:
+        page_size = get_page_size(request)
+    fields = list(ordering)
+    descending = [f'-{field}' for field in fields]
+    ascending = list(fields)
+
+    token = request.query_params.get('cursor')
+    direction = 'next'
+    if token:
+        values, direction = decode_cursor(token, len(fields))
+        try:
+            queryset = queryset.filter(
+                _keyset_filter(fields, values, forward=direction == 'next'))
+        except (DjangoValidationError, ValueError, TypeError):
+            # A well-formed token carrying values of the wrong type.
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+
+    if direction == 'next':
+        rows = list(queryset.order_by(*descending)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        has_next, has_prev = has_more, bool(token)
+    else:
+        rows = list(queryset.order_by(*ascending)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next, has_prev = True, has_more
+
+    def cursor_for(obj, cursor_direction):
+        values = [getattr(obj, field) for field in fields]
+        return encode_cursor(values, cursor_direction)
+
+    next_cursor = prev_cursor = None
+    if rows and has_next:
+        next_cursor = cursor_for(rows[-1], 'next')
+    if rows and has_prev:
+        prev_cursor = cursor_for(rows[0], 'prev')
+
+    return CursorPage(rows, next_cursor, prev_cursor)
+
+
+def paginate_by_page(queryset, request, page_size=None):
+    """
+    Return ``(page, page_number, num_pages)`` using ``Paginator``.
+
+    Out of range or malformed page numbers fall back to the first or last
+    page like the list views always did.
+    """
+    if page_size is None:
+        page_size = get_page_size(request)
+    page = request.query_params.get('page')
+    paginator = Paginator(queryset, page_size)
+
+    try:
+        objects = paginator.page(page)
+    except PageNotAnInteger:
+        objects = paginator.page(1)
+    except EmptyPage:
+        objects = paginator.page(paginator.num_pages)
+
+    return objects, objects.number, paginator.num_pages
+
+
+def paginated_response_data(queryset, request, serializer_class, key,
+                            ordering=('created', 'id'), cursor_only=False,
+                            **serializer_kwargs):
+    """
+    Serialize one page of ``queryset`` into the response body used by the
+    list views.
+
+    The page mode body is ``{key: [...], 'page': n, 'pages': m}``; the
+    cursor mode body is ``{key: [...], 'next': token, 'prev': token}``.
+    ``cursor_only`` always uses cursor mode, for tables too large to count
+    or to skip through with offsets.
+    """
+    if cursor_only or is_cursor_request(request):
+        page = paginate_by_cursor(queryset, request, ordering=ordering)
+        serializer = serializer_class(
+            page.object_list, many=True, **serializer_kwargs)
+        return {
+            key: serializer.data,
+            'next': page.next_cursor,
+            'prev': page.prev_cursor,
+        }
+
+    ordered = queryset.order_by(*[f'-{field}' for field in ordering])
+    objects, page, pages = paginate_by_page(ordered, request)
+    serializer = serializer_class(objects, many=True, **serializer_kwargs)
+    return {
+        key: serializer.data,
+        'page': page,
+        'pages': pages,
+    }
@@ -0,0 +1,39 @@
+"""
+Signal handlers for the core app.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from core.authentication import invalidate_user
+from core.models import Customer, User
+
+
+def forget_user(sender, instance, **kwargs):
+    """
+    Drop a changed user from the authentication cache.
+
+    The entry is dropped again on commit so a request that raced the open
+    transaction cannot keep the old row cached.
+    """
+    invalidate_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
+
+
+def forget_customer_user(sender, instance, **kwargs):
+    """Drop the user of a changed customer from the authentication cache."""
+    invalidate_user(instance.user_id)
+    transaction.on_commit(lambda: invalidate_user(instance.user_id))
+
+
+def connect_signals():
+    """Connect the core signal handlers."""
+    post_save.connect(
+        forget_user, sender=User, dispatch_uid='core.auth.user.save')
+    post_delete.connect(
+        forget_user, sender=User, dispatch_uid='core.auth.user.delete')
+    post_save.connect(
+        forget_customer_user, sender=Customer,
+        dispatch_uid='core.auth.customer.save')
+    post_delete.connect(
+        forget_customer_user, sender=Customer,
+        dispatch_uid='core.auth.customer.delete')
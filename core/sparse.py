@@ -0,0 +1,111 @@
+"""
+Sparse fieldsets for list and detail endpoints.
+
+``?fields=id,name,price`` limits a response to the named fields, and
+``?expand=tags`` chooses which nested relations (the serializer's
+``Meta.expandable_fields``) are embedded. Without ``fields`` every plain
+field is kept, so ``?expand=`` alone drops all nested relations. Without
+either parameter the full representation is returned as before.
+
+The requested field set also trims the query: only the needed columns
+are loaded, and only the needed relations are joined or prefetched.
+"""
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import BaseSerializer
+
+
+class SparseFieldsMixin:
+    """Serializer mixin accepting a ``fields`` argument to trim fields."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def _split(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def expandable_fields(serializer_class):
+    """Return the nested relations ``serializer_class`` can embed."""
+    meta = getattr(serializer_class, 'Meta', None)
+    return set(getattr(meta, 'expandable_fields', ()))
+
+
+def requested_fields(request, serializer_class):
+    """
+    Return the set of fields asked for by the request, or None when the
+    full representation is wanted.
+    """
+    params = request.query_params
+    if 'fields' not in params and 'expand' not in params:
+        return None
+
+    available = set(serializer_class._declared_fields)
+    expandable = expandable_fields(serializer_class)
+
+    if 'fields' in params:
+        names = _split(params['fields'])
+    else:
+        names = available - expandable
+
+    expand = _split(params.get('expand', ''))
+    unknown = expand - expandable
+    if unknown:
+        raise ValidationError(
+            {'expand': f'Unknown relations: {", ".join(sorted(unknown))}.'})
+    names |= expand
+
+    unknown = names - available
+    if unknown:
+        raise ValidationError(
+            {'fields': f'Unknown fields: {", ".join(sorted(unknown))}.'})
+
+    return names
+
+
+def wants(fields, name):
+    """Return True when ``name`` is part of the requested ``fields``."""
+    return fields is None or name in fields
+
+
+def prepare_queryset(queryset, serializer_class, fields, extra=()):
+    """
+    Join the forward relations the requested fields read and, for a
+    sparse request, load only the columns they need.
+
+    ``fields`` is the value of ``requested_fields`` (None means every
+    field); ``extra`` names columns that must always be loaded, such as
+    the ordering columns used by pagination.
+    """
+    declared = serializer_class._declared_fields
+    names = declared.keys() if fields is None else fields
+    opts = queryset.model._meta
+    by_name = {}
+    for model_field in opts.concrete_fields:
+        by_name[model_field.name] = model_field
+        by_name[model_field.attname] = model_field
+
+    columns = set(extra)
+    related = set()
+    for name in names:
+        field = declared[name]
+        source = field.source or name
+        if isinstance(field, BaseSerializer) or source == '*':
+            continue
+        attrs = source.split('.')
+        model_field = by_name.get(attrs[0])
+        if model_field is None:
+            continue
+        columns.add(model_field.name)
+        if model_field.is_relation and attrs[0] == model_field.name:
+            related.add(model_field.name)
+
+    if related:
+        queryset = queryset.select_related(*sorted(related))
+    if fields is not None:
+        queryset = queryset.only(*sorted(columns))
+    return queryset
@@ -0,0 +1,68 @@
+"""
+Streaming JSON responses for large list endpoints.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)``, serialized one
+chunk at a time and written out as soon as they are encoded, so memory
+stays bounded by the chunk size and the first byte leaves immediately.
+"""
+import json
+
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def is_stream_request(request):
+    """Return True when the client asked for a streamed response."""
+    return request.query_params.get('stream') in ('1', 'true')
+
+
+def _encode(data):
+    return json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=False,
+        separators=(',', ':')).encode()
+
+
+def iter_json_list(queryset, serializer_class, chunk_size=DEFAULT_CHUNK_SIZE,
+                   prepare=None, **serializer_kwargs):
+    """
+    Yield the JSON array of ``queryset`` serialized by ``serializer_class``.
+
+    ``prepare`` is called with every object before it is serialized and
+    ``serializer_kwargs`` are passed on to the serializer.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    yield b'['
+    first = True
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        if prepare is not None:
+            for obj in chunk:
+                prepare(obj)
+        serializer = serializer_class(chunk, many=True, **serializer_kwargs)
+        for item in serializer.data:
+            yield _encode(item) if first else b',' + _encode(item)
+            first = False
+    yield b']'
+
+
+def streaming_json_response(queryset, serializer_class, request,
+                            prepare=None, **serializer_kwargs):
+    """Return a ``StreamingHttpResponse`` of the serialized queryset."""
+    try:
+        chunk_size = int(
+            request.query_params.get('chunk_size', DEFAULT_CHUNK_SIZE))
+    except ValueError:
+        chunk_size = DEFAULT_CHUNK_SIZE
+    chunk_size = max(1, min(chunk_size, 5000))
+    return StreamingHttpResponse(
+        iter_json_list(queryset, serializer_class, chunk_size, prepare,
+                       **serializer_kwargs),
+        content_type='application/json',
+    )
@@ -0,0 +1,86 @@
+"""
+Tests for the cached JWT authentication.
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.authentication import CachedJWTAuthentication, clear_user_cache
+from core.models import Customer
+
+
+ME_URL = reverse('user:me')
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    """Test resolving users from access tokens."""
+
+    def setUp(self):
+        clear_user_cache()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        self.customer = Customer.objects.create(
+            user=self.user, name='Customer')
+        self.token = AccessToken.for_user(self.user)
+        self.auth = CachedJWTAuthentication()
+
+    def test_user_and_customer_cached(self):
+        """Test the user and its customer are loaded with one query."""
+        with self.assertNumQueries(1):
+            user = self.auth.get_user(self.token)
+            self.assertEqual(user.customer.name, 'Customer')
+
+        with self.assertNumQueries(0):
+            user = self.auth.get_user(self.token)
+            self.assertEqual(user.customer.name, 'Customer')
+        self.assertEqual(user, self.user)
+
+    def test_cached_user_is_not_shared(self):
+        """Test changes made by one request do not leak into the cache."""
+        self.auth.get_user(self.token).customer.name = 'Changed'
+
+        user = self.auth.get_user(self.token)
+
+        self.assertEqual(user.customer.name, 'Customer')
+        self.assertIs(user.customer.user, user)
+
+    def test_customer_save_invalidates(self):
+        """Test saving the customer drops the cached user."""
+        self.auth.get_user(self.token)
+        self.customer.name = 'Renamed'
+        self.customer.save()
+
+        user = self.auth.get_user(self.token)
+
+        self.assertEqual(user.customer.name, 'Renamed')
+
+    def test_deactivated_user_rejected(self):
+        """Test a user deactivated after being cached is rejected."""
+        self.auth.get_user(self.token)
+        self.user.is_active = False
+        self.user.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+    def test_deleted_user_rejected(self):
+        """Test a deleted user is no longer resolved."""
+        self.auth.get_user(self.token)
+        self.user.delete()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.get_user(self.token)
+
+    def test_bearer_token_request(self):
+        """Test an API request authenticated with an access token."""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+        client.get(ME_URL)
+        response = client.get(ME_URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['email'], self.user.email)
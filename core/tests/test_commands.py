@@ -2,13 +2,49 @@
 Test Custom Management Commands for sqlte 3
 """
 
+import json
+import os
+import tempfile
+
+from datetime import timedelta
+from io import BytesIO, StringIO
 from unittest.mock import patch
 
 from sqlite3 import OperationalError as Sqlite3OpError
 
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, override_settings)
+from django.utils import timezone
+from PIL import Image
+
+from core.management.commands.import_users import (
+    Command as ImportUsersCommand,
+)
+from core.models import (
+    Category,
+    Customer,
+    Order,
+    OrderEvent,
+    OrderItem,
+    Product,
+    ShippingAddress,
+)
+from store import cart_store
+
+
+# A cache shared by processes, as the cart store requires.
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'core-test-cache'),
+    },
+}
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -35,3 +71,289 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class BenchSerializersCommandTests(SimpleTestCase):
+    """Test the serializer benchmark command."""
+
+    def test_bench_serializers_output_identical(self):
+        """Test compiled serialization matches the generic output."""
+        out = StringIO()
+
+        call_command('bench_serializers', count=20, repeat=1, stdout=out)
+
+        self.assertIn('byte-identical', out.getvalue())
+
+
+class BenchCheckoutCommandTests(TransactionTestCase):
+    """Test the checkout load test command."""
+
+    def test_bench_checkout_does_not_oversell(self):
+        """Test concurrent checkouts stop exactly at the stock level."""
+        out = StringIO()
+
+        call_command('bench_checkout', customers=20, threads=4, stock=8,
+                     stdout=out)
+
+        self.assertIn('8 placed, 12 out of stock', out.getvalue())
+        self.assertIn('no stock oversold', out.getvalue())
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderEvent.objects.exists())
+
+
+class ExpireCartsCommandTests(TestCase):
+    """Test the abandoned cart expiry command."""
+
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Electronics')
+        self.product = Product.objects.create(
+            category=category, name='Laptop', price=100)
+        self.customers = []
+        for index in range(4):
+            user = get_user_model().objects.create_user(
+                email=f'user{index}@example.com', password='testpass123')
+            self.customers.append(Customer.objects.create(user=user))
+
+    def _cart(self, customer, idle_days, complete=False):
+        order = Order.objects.create(customer=customer, complete=complete)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1)
+        Order.objects.filter(pk=order.pk).update(
+            updated=timezone.now() - timedelta(days=idle_days))
+        return order
+
+    def test_expire_idle_carts_in_batches(self):
+        """Test idle carts are deleted and everything else is kept."""
+        first = self._cart(self.customers[0], 40)
+        self._cart(self.customers[1], 35)
+        ShippingAddress.objects.create(
+            customer=self.customers[0], order=first, address='Dhaka')
+        fresh = self._cart(self.customers[2], 1)
+        placed = self._cart(self.customers[3], 90, complete=True)
+        out = StringIO()
+
+        call_command('expire_carts', days=30, batch_size=1, stdout=out)
+
+        self.assertEqual(
+            set(Order.objects.values_list('pk', flat=True)),
+            {fresh.pk, placed.pk})
+        self.assertEqual(OrderItem.objects.count(), 2)
+        self.assertIn('Expired 2 cart(s) in 2 batch(es): 2 order line(s) '
+                      'and 1 shipping address(es) deleted.', out.getvalue())
+
+    def test_expire_carts_resumes(self):
+        """Test a run stopped early is finished by the next run."""
+        for customer in self.customers[:3]:
+            self._cart(customer, 40)
+
+        call_command('expire_carts', batch_size=1, max_batches=2,
+                     stdout=StringIO())
+        self.assertEqual(Order.objects.count(), 1)
+
+        call_command('expire_carts', batch_size=1, stdout=StringIO())
+        self.assertEqual(Order.objects.count(), 0)
+
+    @override_settings(CACHES=SHARED_CACHES, CART_STORE={
+        'ENABLED': True, 'CACHE': 'shared'})
+    def test_carts_with_pending_changes_kept(self):
+        """Test carts with changes pending in the cart store are kept."""
+        caches['shared'].clear()
+        pending = self._cart(self.customers[0], 40)
+        self._cart(self.customers[1], 40)
+        cart_store.record(self.customers[0], self.product.pk, 1)
+
+        call_command('expire_carts', stdout=StringIO())
+
+        self.assertEqual(
+            list(Order.objects.values_list('pk', flat=True)), [pending.pk])
+
+    def test_dry_run_deletes_nothing(self):
+        """Test a dry run only reports the carts to expire."""
+        self._cart(self.customers[0], 40)
+        out = StringIO()
+
+        call_command('expire_carts', dry_run=True, stdout=out)
+
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertIn('1 cart(s)', out.getvalue())
+
+
+class InitStockCommandTests(TestCase):
+    """Test the init_stock command."""
+
+    def test_init_stock_sets_empty_stock(self):
+        """Test only products without stock are initialised."""
+        category = Category.objects.create(name='Electronics')
+        other = Category.objects.create(name='Books')
+        empty = Product.objects.create(
+            category=category, name='Laptop', price=100)
+        stocked = Product.objects.create(
+            category=category, name='Phone', price=50, stock=3)
+        book = Product.objects.create(category=other, name='Novel', price=5)
+        out = StringIO()
+
+        call_command('init_stock', 20, category=category.id, stdout=out)
+
+        self.assertEqual(
+            [Product.objects.get(pk=p.pk).stock
+             for p in (empty, stocked, book)],
+            [20, 3, 0])
+        self.assertIn('Initialised the stock of 1 product(s)', out.getvalue())
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersCommandTests(TestCase):
+    """Test the bulk user import command."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as target:
+            target.write(content)
+        return path
+
+    def _jsonl(self, records):
+        return self._write('users.jsonl', ''.join(
+            json.dumps(record) + '\n' for record in records))
+
+    def test_import_csv(self):
+        """Test users and customers are created and bad rows skipped."""
+        get_user_model().objects.create_user(
+            email='taken@example.com', password='testpass123')
+        path = self._write('users.csv', (
+            'email,password,name,phone_number\n'
+            'one@example.com,pass1,One,01711111111\n'
+            'two@EXAMPLE.com,pass2,Two,\n'
+            'one@example.com,pass3,Duplicate,\n'
+            'taken@example.com,pass4,Taken,\n'
+            'not-an-email,pass5,Bad,\n'
+            'three@example.com,,No Password,\n'))
+        out = StringIO()
+
+        call_command('import_users', path, workers=0, batch_size=2,
+                     stdout=out)
+
+        user = get_user_model().objects.get(email='one@example.com')
+        self.assertTrue(user.check_password('pass1'))
+        self.assertEqual(user.customer.phone_number, '01711111111')
+        self.assertEqual(
+            Customer.objects.get(user__email='two@example.com').name, 'Two')
+        self.assertEqual(get_user_model().objects.count(), 3)
+        self.assertIn('Imported 2 user(s) in 3 batch(es); 2 already existed '
+                      'and 2 invalid record(s)', out.getvalue())
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_import_jsonl_non_string_values_invalid(self):
+        """Test JSONL records with non-string fields are counted invalid."""
+        path = self._jsonl([
+            {'email': 'ok@example.com', 'password': 'pass',
+             'phone_number': '8801711111111'},
+            {'email': 'phone@example.com', 'password': 'pass',
+             'phone_number': 8801711111111},
+            {'email': 'password@example.com', 'password': 123},
+            {'email': ['list@example.com'], 'password': 'pass'},
+            {'email': 'name@example.com', 'password': 'pass', 'name': 7},
+        ])
+        out = StringIO()
+
+        call_command('import_users', path, workers=0, stdout=out)
+
+        self.assertEqual(
+            list(get_user_model().objects.values_list('email', flat=True)),
+            ['ok@example.com'])
+        self.assertIn('Imported 1 user(s) in 1 batch(es); 0 already existed '
+                      'and 4 invalid record(s)', out.getvalue())
+
+    def test_import_resumes_from_checkpoint(self):
+        """Test records before the checkpoint are not read again."""
+        path = self._jsonl([
+            {'email': f'user{index}@example.com', 'password': 'pass'}
+            for index in range(5)
+        ])
+        self._write('users.jsonl.checkpoint', json.dumps({'records': 3}))
+        out = StringIO()
+
+        call_command('import_users', path, workers=0, stdout=out)
+
+        self.assertEqual(
+            set(get_user_model().objects.values_list('email', flat=True)),
+            {'user3@example.com', 'user4@example.com'})
+        self.assertIn('Resuming after 3 record(s).', out.getvalue())
+
+    def test_import_resumes_after_failure(self):
+        """Test a failed import continues after the last saved batch."""
+        path = self._jsonl([
+            {'email': f'user{index}@example.com', 'password': 'pass'}
+            for index in range(4)
+        ])
+        insert = ImportUsersCommand._insert
+        calls = []
+
+        def failing_insert(command, batch, hashes):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise OperationalError('disk I/O error')
+            return insert(command, batch, hashes)
+
+        with patch.object(ImportUsersCommand, '_insert', failing_insert):
+            with self.assertRaises(OperationalError):
+                call_command('import_users', path, workers=0, batch_size=2,
+                             stdout=StringIO())
+        self.assertEqual(get_user_model().objects.count(), 2)
+
+        out = StringIO()
+        call_command('import_users', path, workers=0, batch_size=2,
+                     stdout=out)
+
+        self.assertEqual(get_user_model().objects.count(), 4)
+        self.assertIn('Imported 2 user(s) in 1 batch(es)', out.getvalue())
+
+    def test_import_hashes_in_process_pool(self):
+        """Test passwords hashed by worker processes are usable."""
+        path = self._jsonl([
+            {'email': f'user{index}@example.com', 'password': f'pass{index}'}
+            for index in range(6)
+        ])
+
+        call_command('import_users', path, workers=2, batch_size=4,
+                     stdout=StringIO())
+
+        users = get_user_model().objects.order_by('email')
+        self.assertEqual(Customer.objects.count(), 6)
+        for index, user in enumerate(users):
+            self.assertTrue(user.check_password(f'pass{index}'))
+
+
+class WarmRenditionsCommandTests(TestCase):
+    """Test the product image rendition backfill command."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        category = Category.objects.create(name='Electronics')
+        for index in range(2):
+            product = Product(category=category, name=f'Product {index}',
+                              price=100)
+            buffer = BytesIO()
+            Image.new('RGB', (900, 900)).save(buffer, format='JPEG')
+            product.image.save(
+                f'product{index}.jpg', ContentFile(buffer.getvalue()))
+        Product.objects.create(category=category, name='No image', price=1)
+
+    def test_warm_renditions(self):
+        """Test missing renditions are created and present ones skipped."""
+        out = StringIO()
+        call_command('warm_renditions', workers=2, stdout=out)
+        self.assertIn('of 2 image(s): 12 created, 0 already present, '
+                      '0 failed.', out.getvalue())
+
+        out = StringIO()
+        call_command('warm_renditions', workers=0, stdout=out)
+        self.assertIn('12 already present', out.getvalue())
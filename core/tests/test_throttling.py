@@ -0,0 +1,168 @@
+"""
+Tests for the sliding-window throttles.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from core import throttling
+
+
+PLACE_ORDER_URL = reverse('store:place_order')
+
+
+class TwoPerMinuteThrottle(throttling.AnonRateThrottle):
+    rate = '2/min'
+
+
+class SQLiteStoreTests(TestCase):
+    """Test the SQLite counter store."""
+
+    def setUp(self):
+        self.store = throttling.SQLiteStore(
+            'file:throttle_tests?mode=memory&cache=shared')
+
+    def test_counts_roll_over_windows(self):
+        """Test the current count becomes the previous one."""
+        self.assertEqual(self.store.hit('client', 10, 60), (0, 1))
+        self.assertEqual(self.store.hit('client', 10, 60), (0, 2))
+        self.assertEqual(self.store.hit('client', 11, 60), (2, 1))
+        self.assertEqual(self.store.hit('client', 13, 60), (0, 1))
+        self.assertEqual(self.store.hit('other', 13, 60), (0, 1))
+
+    def test_undo_takes_back_a_hit(self):
+        """Test an undone hit is not counted."""
+        self.store.hit('client', 10, 60)
+        self.store.hit('client', 10, 60)
+
+        self.store.undo('client', 10)
+        self.store.undo('client', 9)
+
+        self.assertEqual(self.store.hit('client', 10, 60), (0, 2))
+
+    def test_prune_keeps_live_counters(self):
+        """Test pruning only deletes counters of past windows."""
+        self.store.hit('idle', 10, 60)
+        self.store.hit('active', 20, 60)
+
+        self.store.prune(20 * 60)
+
+        self.assertEqual(self.store.hit('idle', 20, 60), (0, 1))
+        self.assertEqual(self.store.hit('active', 20, 60), (0, 2))
+
+
+class CacheStoreTests(TestCase):
+    """Test the cache counter store."""
+
+    def test_counts_roll_over_windows(self):
+        """Test counts of the previous window are read back."""
+        store = throttling.CacheStore('default')
+        store.cache.clear()
+
+        store.hit('client', 10, 60)
+        store.hit('client', 10, 60)
+
+        self.assertEqual(store.hit('client', 11, 60), (2, 1))
+
+    def test_undo_takes_back_a_hit(self):
+        """Test an undone hit is not counted."""
+        store = throttling.CacheStore('default')
+        store.cache.clear()
+        store.hit('client', 10, 60)
+        store.hit('client', 10, 60)
+
+        store.undo('client', 10)
+        store.undo('client', 9)
+
+        self.assertEqual(store.hit('client', 10, 60), (0, 2))
+
+
+class SlidingWindowThrottleTests(TestCase):
+    """Test the two-window estimate."""
+
+    def setUp(self):
+        throttling.get_store().clear()
+        self.request = APIView().initialize_request(
+            APIRequestFactory().get('/'))
+
+    def _allowed(self, now):
+        throttle = TwoPerMinuteThrottle()
+        throttle.timer = lambda: now
+        return throttle.allow_request(self.request, None), throttle
+
+    def test_previous_window_is_weighted(self):
+        """Test requests of the previous window count less as it ages."""
+        self.assertTrue(self._allowed(600)[0])
+        self.assertTrue(self._allowed(610)[0])
+        self.assertFalse(self._allowed(620)[0])
+
+        # The rejected request is not counted: 2 earlier requests weigh
+        # 2 * 0.75, and one more makes 2.5.
+        allowed, throttle = self._allowed(675)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(throttle.wait(), 15)
+
+        # Neither rejection counts, so 2 * 0.5 + 1 is within the limit.
+        self.assertTrue(self._allowed(690)[0])
+        self.assertFalse(self._allowed(691)[0])
+
+    def test_store_failure_lets_requests_through(self):
+        """Test a broken store does not reject requests."""
+        with patch.object(throttling.SQLiteStore, 'hit',
+                          side_effect=throttling.sqlite3.OperationalError):
+            for now in range(600, 610):
+                self.assertTrue(self._allowed(now)[0])
+
+    @override_settings(THROTTLING={'CACHE': 'default'})
+    def test_cache_store_failure_lets_requests_through(self):
+        """Test a cache backend error does not reject requests."""
+        throttling.get_store.cache_clear()
+        self.addCleanup(throttling.get_store.cache_clear)
+
+        with patch.object(throttling.get_store().cache, 'incr',
+                          side_effect=ConnectionError):
+            for now in range(600, 610):
+                self.assertTrue(self._allowed(now)[0])
+
+
+class ScopedThrottleTests(TestCase):
+    """Test per-view throttle scopes."""
+
+    def setUp(self):
+        throttling.get_store().clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def test_place_order_scope(self):
+        """Test checkout attempts are limited per user."""
+        for _ in range(10):
+            response = self.client.post(PLACE_ORDER_URL)
+            self.assertEqual(
+                response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(PLACE_ORDER_URL)
+
+        self.assertEqual(
+            response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+
+@override_settings(THROTTLING={'CACHE': 'default'})
+class StoreSelectionTests(TestCase):
+    """Test the store is chosen from the settings."""
+
+    def tearDown(self):
+        throttling.get_store.cache_clear()
+
+    def test_cache_store_selected(self):
+        """Test naming a cache alias selects the cache store."""
+        throttling.get_store.cache_clear()
+
+        self.assertIsInstance(throttling.get_store(), throttling.CacheStore)
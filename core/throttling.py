@@ -0,0 +1,238 @@
+"""
+Sliding-window request throttling shared by every worker.
+
+DRF's throttles keep a list of request timestamps per client in the
+local-memory cache, so each worker enforces its own limit and memory
+grows with the request rate. The throttles here keep two counters per
+client and scope instead: requests in the current fixed window and in
+the previous one. The rate over the last ``duration`` seconds is
+estimated as::
+
+    previous * (1 - elapsed / duration) + current
+
+which assumes the previous window's requests were evenly spread.
+Only allowed requests are counted; a rejected request's hit is taken
+back. A burst from a shared address therefore uses up the limit but does
+not keep the address locked out until the rejected requests age out.
+
+Counters live in a store shared by the workers:
+
+* ``SQLiteStore`` (the default) keeps one row per client and scope in a
+  SQLite file next to the project, updated with a single upsert.
+* ``CacheStore`` uses a Django cache, for deployments with a shared
+  cache such as redis or memcached. Select it by naming the alias in
+  ``THROTTLING['CACHE']``.
+
+If the store fails the request is let through rather than rejected.
+"""
+import functools
+import random
+import sqlite3
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from rest_framework import throttling
+
+from core.conf import setting_getter
+
+
+DEFAULTS = {
+    'CACHE': None,
+    'PATH': None,
+    'TIMEOUT': 5,
+}
+
+# One in this many hits also deletes counters of idle clients.
+PRUNE_EVERY = 1000
+
+MEMORY_PATH = 'file:throttle?mode=memory&cache=shared'
+
+
+get_setting = setting_getter('THROTTLING', DEFAULTS)
+
+
+class SQLiteStore:
+    """Throttle counters in a SQLite database shared by all workers."""
+
+    def __init__(self, path, timeout=5):
+        self.path = str(path)
+        self.timeout = timeout
+        self._local = threading.local()
+        # An in-memory database lives as long as one connection to it.
+        self._keeper = self._connect() if 'mode=memory' in self.path else None
+
+    def _connect(self):
+        connection = sqlite3.connect(
+            self.path, timeout=self.timeout, isolation_level=None,
+            uri=self.path.startswith('file:'), check_same_thread=False)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS throttle_counter ('
+            'key TEXT PRIMARY KEY, bucket INTEGER NOT NULL, '
+            'previous INTEGER NOT NULL, current INTEGER NOT NULL, '
+            'expires REAL NOT NULL)')
+        return connection
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def hit(self, key, bucket, duration):
+        """
+        Count a request of ``key`` in window ``bucket``.
+
+        Returns ``(previous, current)``, the counts of the previous window
+        and of ``bucket`` including this request.
+        """
+        # Column references on the right-hand side read the stored row.
+        previous, current = self.connection.execute(
+            'INSERT INTO throttle_counter '
+            '(key, bucket, previous, current, expires) '
+            'VALUES (:key, :bucket, 0, 1, :expires) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'previous = CASE '
+            '  WHEN excluded.bucket <= bucket THEN previous '
+            '  WHEN excluded.bucket = bucket + 1 THEN current '
+            '  ELSE 0 END, '
+            'current = CASE '
+            '  WHEN excluded.bucket <= bucket THEN current + 1 '
+            '  ELSE 1 END, '
+            'bucket = MAX(bucket, excluded.bucket), '
+            'expires = MAX(expires, excluded.expires) '
+            'RETURNING previous, current',
+            {'key': key, 'bucket': bucket,
+             'expires': (bucket + 2) * duration},
+        ).fetchone()
+        if random.randrange(PRUNE_EVERY) == 0:
+            self.prune(bucket * duration)
+        return previous, current
+
+    def undo(self, key, bucket):
+        """Take back a hit of ``key`` in window ``bucket``."""
+        self.connection.execute(
+            'UPDATE throttle_counter SET current = current - 1 '
+            'WHERE key = ? AND bucket = ? AND current > 0', (key, bucket))
+
+    def prune(self, now):
+        """Delete the counters that no longer affect any decision."""
+        self.connection.execute(
+            'DELETE FROM throttle_counter WHERE expires < ?', (now,))
+
+    def clear(self):
+        """Delete every counter."""
+        self.connection.execute('DELETE FROM throttle_counter')
+
+
+class CacheStore:
+    """Throttle counters in a Django cache, one entry per window."""
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def hit(self, key, bucket, duration):
+        """See ``SQLiteStore.hit``."""
+        current_key = f'throttle:{key}:{bucket}'
+        self.cache.add(current_key, 0, timeout=2 * duration)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # Expired between add() and incr().
+            self.cache.set(current_key, 1, timeout=2 * duration)
+            current = 1
+        previous = self.cache.get(f'throttle:{key}:{bucket - 1}', 0)
+        return previous, current
+
+    def undo(self, key, bucket):
+        """See ``SQLiteStore.undo``."""
+        try:
+            self.cache.decr(f'throttle:{key}:{bucket}')
+        except ValueError:
+            # The counter has expired; there is nothing to take back.
+            pass
+
+    def clear(self):
+        """Counters expire on their own; there is nothing to delete."""
+
+
+def _default_path():
+    """
+    Return where ``SQLiteStore`` keeps its counters.
+
+    While the tests run on an in-memory database the counters are kept in
+    memory too, so every test run starts from zero.
+    """
+    name = str(connections['default'].settings_dict['NAME'])
+    if name == ':memory:' or 'mode=memory' in name:
+        return MEMORY_PATH
+    return get_setting('PATH') or settings.BASE_DIR / 'throttle.sqlite3'
+
+
+@functools.lru_cache(maxsize=None)
+def get_store():
+    """Return the configured counter store."""
+    if get_setting('CACHE'):
+        return CacheStore(get_setting('CACHE'))
+    return SQLiteStore(_default_path(), timeout=get_setting('TIMEOUT'))
+
+
+class SlidingWindowRateThrottle(throttling.SimpleRateThrottle):
+    """
+    ``SimpleRateThrottle`` counting requests with a two-window estimate.
+
+    Subclasses provide ``scope`` and ``get_cache_key`` as with DRF's
+    throttles.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        bucket, offset = divmod(self.now, self.duration)
+        store = get_store()
+        try:
+            self.previous, self.current = store.hit(
+                self.key, int(bucket), self.duration)
+        except Exception:
+            # Any backend error, e.g. redis being unreachable.
+            return True
+        self.elapsed = offset / self.duration
+        self.estimate = self.previous * (1 - self.elapsed) + self.current
+        if self.estimate > self.num_requests:
+            try:
+                store.undo(self.key, int(bucket))
+            except Exception:
+                pass
+            return self.throttle_failure()
+        return True
+
+    def wait(self):
+        """Return the seconds until the estimate drops below the limit."""
+        if self.current > self.num_requests or not self.previous:
+            # Only the start of the next window brings the count down.
+            return (1 - self.elapsed) * self.duration
+        excess = self.estimate - self.num_requests
+        return excess / self.previous * self.duration
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle,
+                       SlidingWindowRateThrottle):
+    """Limit anonymous clients by IP address, ``anon`` scope."""
+
+
+class UserRateThrottle(throttling.UserRateThrottle,
+                       SlidingWindowRateThrottle):
+    """Limit authenticated users by id, ``user`` scope."""
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle,
+                         SlidingWindowRateThrottle):
+    """Limit the views that set ``throttle_scope`` by that scope's rate."""
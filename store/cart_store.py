@@ -0,0 +1,197 @@
+"""
+Write-behind cart store.
+
+When ``CART_STORE['ENABLED']`` is set, ``UpdateCart`` records each +1/-1
+as a pending quantity delta in a Django cache instead of writing
+``Order``/``OrderItem`` rows. Pending deltas are flushed to the database
+in one transaction when enough of them pile up or the oldest one is
+older than ``FLUSH_INTERVAL`` seconds. Reads of the cart and checkout
+flush synchronously first. ``manage.py flush_carts`` flushes every
+pending cart and is meant to run periodically.
+
+``CACHE`` must name a cache shared by every worker and the management
+commands, such as redis, that does not evict entries without a timeout;
+per-process caches are refused. Each customer's pending deltas are one
+entry with its own lock, so carts never wait on each other, and the
+entry itself marks the cart as pending.
+"""
+import time
+import uuid
+
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from core.cache import shared_cache
+from core.conf import setting_getter
+from core.models import Customer, Order, OrderItem, Product
+
+
+DEFAULTS = {
+    'ENABLED': False,
+    'CACHE': None,
+    'FLUSH_THRESHOLD': 20,
+    'FLUSH_INTERVAL': 30,
+}
+
+LOCK_TIMEOUT = 5
+
+LOCK_DELAY = 0.005
+
+# Customers whose pending entries are looked up at once by ``flush_all``.
+SCAN_CHUNK_SIZE = 1000
+
+
+class CartBusy(Exception):
+    """A cart's lock could not be taken within ``LOCK_TIMEOUT``."""
+
+
+get_setting = setting_getter('CART_STORE', DEFAULTS)
+
+
+def is_enabled():
+    """Return True when cart writes go through the cart store."""
+    if not get_setting('ENABLED'):
+        return False
+    # Refuse to keep carts in a cache the workers do not share.
+    _cache()
+    return True
+
+
+def _cache():
+    return shared_cache(get_setting('CACHE'), "CART_STORE['CACHE']")
+
+
+def _pending_key(customer_id):
+    return f'cart:pending:{customer_id}'
+
+
+@contextmanager
+def _locked(key):
+    """
+    Hold a cache lock around a read-modify-write of ``key``.
+
+    Waits up to ``LOCK_TIMEOUT``, by which time a lock left behind by a
+    crashed holder has expired, then raises ``CartBusy``.
+    """
+    cache = _cache()
+    lock_key = f'{key}:lock'
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while not cache.add(lock_key, token, LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            raise CartBusy(key)
+        time.sleep(LOCK_DELAY)
+    try:
+        yield cache
+    finally:
+        # Once expired the lock may belong to another caller; keep it.
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def apply_cart_deltas(customer, deltas):
+    """
+    Apply ``{product_id: quantity_delta}`` to the customer's open order.
+
+    Runs in one transaction with a fixed number of queries. Lines are
+    adjusted with ``F()`` expressions, so changes flushed by different
+    workers add up, and products that no longer exist are dropped.
+    """
+    deltas = {pid: delta for pid, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        order = Order.objects.open_for(customer)
+        existing_products = Product.objects.filter(
+            pk__in=deltas).values_list('pk', flat=True)
+        OrderItem.objects.apply_quantities(
+            order, {pid: deltas[pid] for pid in existing_products},
+            absolute=False)
+        order.save(update_fields=['updated'])
+
+
+def record(customer, product_id, delta):
+    """Record a quantity change, flushing when the cart is due."""
+    key = _pending_key(customer.pk)
+    try:
+        with _locked(key) as cache:
+            pending = cache.get(key) or {
+                'since': time.time(), 'ops': 0, 'deltas': {}}
+            deltas = pending['deltas']
+            deltas[product_id] = deltas.get(product_id, 0) + delta
+            pending['ops'] += 1
+            cache.set(key, pending, None)
+    except CartBusy:
+        # Deltas are additive, so writing this one through is safe.
+        apply_cart_deltas(customer, {product_id: delta})
+        return
+
+    due = (
+        pending['ops'] >= get_setting('FLUSH_THRESHOLD')
+        or time.time() - pending['since'] >= get_setting('FLUSH_INTERVAL')
+    )
+    if due:
+        flush(customer)
+
+
+def _take_pending(customer_id):
+    key = _pending_key(customer_id)
+    with _locked(key) as cache:
+        pending = cache.get(key)
+        cache.delete(key)
+    return pending
+
+
+def flush(customer):
+    """Write the customer's pending cart changes to the database."""
+    pending = _take_pending(customer.pk)
+    if not pending:
+        return
+    try:
+        apply_cart_deltas(customer, pending['deltas'])
+    except Exception:
+        _restore(customer.pk, pending)
+        raise
+
+
+def _restore(customer_id, pending):
+    """Put changes back after a failed flush so the next one retries."""
+    key = _pending_key(customer_id)
+    with _locked(key) as cache:
+        current = cache.get(key)
+        if current is not None:
+            for product_id, delta in current['deltas'].items():
+                pending['deltas'][product_id] = (
+                    pending['deltas'].get(product_id, 0) + delta)
+            pending['ops'] += current['ops']
+        cache.set(key, pending, None)
+
+
+def pending_customer_ids(customer_ids):
+    """Return those of ``customer_ids`` with unflushed cart changes."""
+    keys = {_pending_key(pk): pk for pk in customer_ids}
+    return {keys[key] for key in _cache().get_many(list(keys))}
+
+
+def flush_all():
+    """
+    Flush every cart with pending changes and return how many.
+
+    Customers are scanned in primary key order, ``SCAN_CHUNK_SIZE`` at a
+    time, with one cache lookup per chunk.
+    """
+    flushed = 0
+    last_id = 0
+    customer_ids = Customer.objects.order_by('pk').values_list(
+        'pk', flat=True)
+    while True:
+        chunk = list(customer_ids.filter(pk__gt=last_id)[:SCAN_CHUNK_SIZE])
+        if not chunk:
+            return flushed
+        last_id = chunk[-1]
+        for customer in Customer.objects.filter(
+                pk__in=pending_customer_ids(chunk)):
+            flush(customer)
+            flushed += 1
@@ -0,0 +1,125 @@
+"""
+Response cache for the public catalog endpoints.
+
+Cached bodies are keyed by view, URL arguments, query parameters and the
+current catalog version. Every write to a catalog model bumps the version
+(see ``store.signals``), so stale entries are never served; they simply
+stop being looked up and age out of the LRU.
+
+The version is the single ``CatalogVersion`` row, so every worker sees
+the same value and a write invalidates the responses cached by all of
+them. It is replaced in the writing transaction and becomes visible
+with the data it stands for. Versions are random tokens rather than a
+counter, so one rolled back with its transaction is never reused.
+Bodies are kept in an in-process LRU and, when ``SHARED_CACHE`` names a
+``CACHES`` alias, also in that shared backend.
+"""
+import functools
+import hashlib
+import secrets
+
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.cache import LRUCache, detach
+from core.conditional import make_etag, not_modified, with_etag
+from core.conf import setting_getter
+from core.models import CatalogVersion
+
+
+VERSION_PK = 1
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MAX_ENTRIES': 512,
+    'TIMEOUT': 300,
+    'SHARED_CACHE': None,
+}
+
+
+get_setting = setting_getter('CATALOG_CACHE', DEFAULTS)
+
+
+_local = LRUCache(
+    max_entries=get_setting('MAX_ENTRIES'), ttl=get_setting('TIMEOUT'))
+
+
+def _shared_cache():
+    alias = get_setting('SHARED_CACHE')
+    return caches[alias] if alias else None
+
+
+def get_catalog_version():
+    """Return the current catalog version."""
+    version = CatalogVersion.objects.filter(pk=VERSION_PK).values_list(
+        'version', flat=True).first()
+    if version is None:
+        version = bump_catalog_version()
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response; returns the new version."""
+    version = secrets.token_hex(16)
+    updated = CatalogVersion.objects.filter(pk=VERSION_PK).update(
+        version=version)
+    if not updated:
+        row, created = CatalogVersion.objects.get_or_create(
+            pk=VERSION_PK, defaults={'version': version})
+        version = row.version
+    return version
+
+
+def make_cache_key(view, request, kwargs, version):
+    """Build the cache key of a catalog request."""
+    params = sorted(request.query_params.lists())
+    raw = repr((type(view).__name__, sorted(kwargs.items()), params))
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'catalog:{version}:{digest}'
+
+
+def cache_catalog_response(view_method):
+    """
+    Serve a catalog ``get`` handler from the response cache.
+
+    Responses carry an ETag derived from the cache key, so a client that
+    sends it back in ``If-None-Match`` gets a 304 before any lookup or
+    serialization happens.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        if not get_setting('ENABLED'):
+            return view_method(view, request, *args, **kwargs)
+
+        key = make_cache_key(view, request, kwargs, get_catalog_version())
+        etag = make_etag(request, key)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        data = _local.get(key)
+        shared = _shared_cache()
+        if data is None and shared is not None:
+            data = shared.get(key)
+            if data is not None:
+                _local.set(key, data)
+        if data is not None:
+            return with_etag(Response(data, status=status.HTTP_200_OK), etag)
+
+        response = view_method(view, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            data = detach(response.data)
+            _local.set(key, data)
+            if shared is not None:
+                shared.set(key, data, timeout=get_setting('TIMEOUT'))
+            with_etag(response, etag)
+        return response
+
+    return wrapper
+
+
+def clear_local_cache():
+    """Empty this process' response cache."""
+    _local.clear()
@@ -0,0 +1,87 @@
+"""
+Checkout of a customer's open order.
+
+Placing an order claims the open order, freezes the price and name of
+every line, reserves stock, records the amount paid and logs the status
+change as an ``OrderEvent`` in one transaction. Stock is taken with one
+conditional ``UPDATE ... SET stock = stock - quantity WHERE stock >=
+quantity`` per product, in product id order so concurrent checkouts lock
+rows in the same order and cannot deadlock. If any product is short the
+transaction rolls back and nothing is changed.
+
+Stock is set through the admin product API. Products created before
+stock was enforced have none; run ``manage.py init_stock`` when rolling
+this out so their checkouts are not refused.
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import Order, OrderEvent, OrderItem, Product
+
+
+class CheckoutError(Exception):
+    """Base class for checkout failures."""
+
+
+class EmptyCart(CheckoutError):
+    """The customer has no open order or it has no lines."""
+
+
+class InsufficientStock(CheckoutError):
+    """Some products do not have enough stock for the order."""
+
+    def __init__(self, product_ids):
+        super().__init__(f'Insufficient stock for products {product_ids}.')
+        self.product_ids = product_ids
+
+
+def place_order(customer):
+    """
+    Complete the customer's open order and return it.
+
+    ``paid_amount`` and ``cart_total`` are computed from current product
+    prices, which are also stored on the lines. Raises ``EmptyCart`` or
+    ``InsufficientStock``.
+    """
+    with transaction.atomic():
+        order = Order.objects.filter(
+            customer=customer, complete=False).first()
+        if order is None:
+            raise EmptyCart('There is no open order to place.')
+        items = list(
+            order.order_items.select_related('product').order_by('product_id'))
+        if not items:
+            raise EmptyCart('The cart is empty.')
+
+        # Freeze prices on the lines so order history never recomputes.
+        for item in items:
+            item.freeze()
+        total = sum(item.item_price * item.quantity for item in items)
+
+        # Claim the order first: a concurrent checkout of the same cart
+        # finds it already complete and reserves nothing.
+        now = timezone.now()
+        claimed = Order.objects.filter(pk=order.pk, complete=False).update(
+            complete=True, order_status='Confirmed', paid_amount=total,
+            cart_total=total, updated=now, completed_at=now)
+        if not claimed:
+            raise EmptyCart('The order was already placed.')
+        OrderEvent.record(order, order.order_status, 'Confirmed')
+        OrderItem.objects.bulk_update(items, ['item_price', 'product_name'])
+
+        short = []
+        for item in items:
+            reserved = Product.objects.filter(
+                pk=item.product_id, stock__gte=item.quantity,
+            ).update(stock=F('stock') - item.quantity)
+            if not reserved:
+                short.append(item.product_id)
+        if short:
+            raise InsufficientStock(short)
+
+    order.complete = True
+    order.completed_at = now
+    order.order_status = 'Confirmed'
+    order.paid_amount = order.cart_total = total
+    return order
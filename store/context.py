@@ -0,0 +1,84 @@
+"""
+Per-request resolution of the customer and their open order.
+
+Store views and serializers need the requesting customer and, for cart
+and shipping changes, the customer's open order. ``get_customer`` and
+``get_open_order`` look them up once per request and keep them on the
+request, so a view and the serializers it calls share one lookup.
+
+The customer usually comes with the user from ``CachedJWTAuthentication``.
+Otherwise the open order is fetched together with its customer in one
+joined query. The id of each customer's open order is kept in the
+default cache across requests and fetched by primary key; it is checked
+to still be open on every use, so placing or expiring a cart never needs
+to invalidate it.
+"""
+from django.core.cache import cache
+
+from core.models import Customer, Order
+
+
+OPEN_ORDER_TIMEOUT = 60 * 60
+
+_CUSTOMER_ATTR = '_store_customer'
+_ORDER_ATTR = '_store_open_order'
+
+
+def _open_order_key(user_id):
+    return f'store:open-order:{user_id}'
+
+
+def get_customer(request):
+    """Return the customer of ``request.user``, creating it if needed."""
+    customer = getattr(request, _CUSTOMER_ATTR, None)
+    if customer is None:
+        # Loaded with the user by ``CachedJWTAuthentication``.
+        customer = request.user._state.fields_cache.get('customer')
+        if customer is None:
+            customer, created = Customer.objects.get_or_create(
+                user=request.user)
+        setattr(request, _CUSTOMER_ATTR, customer)
+    return customer
+
+
+def get_open_order(request):
+    """Return the open order of the requesting customer, creating it."""
+    order = getattr(request, _ORDER_ATTR, None)
+    if order is not None:
+        return order
+
+    user = request.user
+    customer = getattr(request, _CUSTOMER_ATTR, None) or (
+        user._state.fields_cache.get('customer'))
+    orders = Order.objects.filter(complete=False)
+    if customer is None:
+        orders = orders.select_related('customer').filter(
+            customer__user=user)
+    else:
+        orders = orders.filter(customer=customer)
+    key = _open_order_key(user.pk)
+    order_id = cache.get(key)
+    if order_id is not None:
+        orders = orders.filter(pk=order_id)
+
+    order = orders.first()
+    if order is None:
+        order = Order.objects.open_for(get_customer(request))
+    elif customer is None:
+        setattr(request, _CUSTOMER_ATTR, order.customer)
+    else:
+        order.customer = customer
+    if order.pk != order_id:
+        cache.set(key, order.pk, OPEN_ORDER_TIMEOUT)
+    setattr(request, _ORDER_ATTR, order)
+    return order
+
+
+class CustomerContextMixin:
+    """View mixin resolving the requesting customer and their open order."""
+
+    def get_customer(self):
+        return get_customer(self.request)
+
+    def get_open_order(self):
+        return get_open_order(self.request)
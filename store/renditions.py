@@ -0,0 +1,83 @@
+"""
+Eager generation of product image renditions.
+
+Renditions of ``Product.image`` (every size in
+``VERSATILEIMAGEFIELD_RENDITION_KEY_SETS``) are otherwise created on
+demand, by whichever request first asks for them. Product writes through
+``ProductSerializer`` schedule the new image's renditions on a small
+in-process thread pool once the transaction commits, and
+``manage.py warm_renditions`` backfills existing products.
+
+Creation on demand stays enabled, so a rendition requested before the
+pool gets to it is still served.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+
+from django.conf import settings
+from django.db import transaction
+from versatileimagefield.utils import get_rendition_key_set
+
+from core.conf import setting_getter
+from core.models import Product
+
+
+DEFAULTS = {
+    'ENABLED': True,
+    'WORKERS': 2,
+}
+
+
+get_setting = setting_getter('PRODUCT_RENDITIONS', DEFAULTS)
+
+
+_executor = ThreadPoolExecutor(max_workers=get_setting('WORKERS'))
+
+
+def size_keys():
+    """Return the sized keys of every configured rendition key set."""
+    keys = set()
+    key_sets = getattr(settings, 'VERSATILEIMAGEFIELD_RENDITION_KEY_SETS', {})
+    for name in key_sets:
+        keys.update(
+            size_key for label, size_key in get_rendition_key_set(name)
+            if not size_key.endswith('url'))
+    return sorted(keys)
+
+
+def _rendition(image, size_key):
+    """Return the ``SizedImageInstance`` of ``size_key`` for ``image``."""
+    *attrs, size = size_key.split('__')
+    return reduce(getattr, attrs, image)[size]
+
+
+def warm_image(name):
+    """
+    Create the missing renditions of the stored image ``name``.
+
+    Returns ``(created, present, failed)`` counts of rendition files.
+    """
+    created = present = failed = 0
+    image = Product(image=name).image
+    for size_key in size_keys():
+        image.create_on_demand = False
+        if image.storage.exists(_rendition(image, size_key).name):
+            present += 1
+            continue
+        image.create_on_demand = True
+        try:
+            _rendition(image, size_key)
+        except Exception:
+            # A broken upload must not stop the other renditions.
+            failed += 1
+        else:
+            created += 1
+    return created, present, failed
+
+
+def schedule_renditions(product):
+    """Create the renditions of ``product``'s image after commit."""
+    if not get_setting('ENABLED') or not product.image:
+        return
+    name = product.image.name
+    transaction.on_commit(lambda: _executor.submit(warm_image, name))
@@ -0,0 +1,138 @@
+"""
+Full-text product search.
+
+On SQLite the catalog is indexed in an FTS5 table whose rowid is the
+product id, with one column each for the product name, description and
+the titles of its tags. The index is kept up to date by the handlers in
+``store.signals`` and queried with bm25 ranking. Other databases fall
+back to ``icontains`` lookups.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from core.models import Product, ProductTagConnector, Tag
+
+
+FTS_TABLE = 'store_product_fts'
+
+# bm25 column weights for name, description and tags.
+RANK_WEIGHTS = (10.0, 1.0, 5.0)
+
+MAX_TERMS = 10
+
+
+def is_supported(conn=None):
+    """Return True when the database provides the FTS5 index."""
+    return (conn or connection).vendor == 'sqlite'
+
+
+def create_index(conn):
+    """Create and fill the FTS5 table."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+            'name, description, tags, '
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+    rebuild_index(conn)
+
+
+def drop_index(conn):
+    """Drop the FTS5 table."""
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def _document_select(where):
+    product = Product._meta.db_table
+    connector = ProductTagConnector._meta.db_table
+    tag = Tag._meta.db_table
+    return (
+        f'INSERT INTO {FTS_TABLE}(rowid, name, description, tags) '
+        f'SELECT p.id, p.name, COALESCE(p.description, \'\'), '
+        f'COALESCE((SELECT group_concat(t.title, \' \') FROM {connector} c '
+        f'INNER JOIN {tag} t ON t.id = c.tag_id '
+        f'WHERE c.product_id = p.id), \'\') '
+        f'FROM {product} p {where}'
+    )
+
+
+def rebuild_index(conn=None):
+    """Re-index every product."""
+    conn = conn or connection
+    if not is_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(_document_select(''))
+
+
+def index_products(product_ids):
+    """(Re-)index the given products, dropping ids that no longer exist."""
+    product_ids = list(product_ids)
+    if not product_ids or not is_supported():
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            product_ids)
+        cursor.execute(
+            _document_select(f'WHERE p.id IN ({placeholders})'),
+            product_ids)
+
+
+def remove_products(product_ids):
+    """Remove the given products from the index."""
+    product_ids = list(product_ids)
+    if not product_ids or not is_supported():
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            product_ids)
+
+
+def build_match_expression(query):
+    """
+    Turn free text into an FTS5 query.
+
+    Every word becomes a quoted prefix term so user input can never be
+    parsed as FTS5 syntax; terms are ANDed together.
+    """
+    terms = re.findall(r'\w+', query)[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_product_ids(query, limit, offset=0):
+    """Return the ids of the products matching ``query``, best first."""
+    expression = build_match_expression(query)
+    if not expression:
+        return []
+
+    if not is_supported():
+        return _fallback_search(query, limit, offset)
+
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s OFFSET %s',
+            [expression, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _fallback_search(query, limit, offset):
+    condition = Q()
+    for term in re.findall(r'\w+', query)[:MAX_TERMS]:
+        condition &= (
+            Q(name__icontains=term)
+            | Q(description__icontains=term)
+            | Q(producttagconnector__tag__title__icontains=term)
+        )
+    ids = Product.objects.filter(condition).order_by(
+        '-created', '-id').values_list('id', flat=True).distinct()
+    return list(ids[offset:offset + limit])
@@ -3,14 +3,17 @@
 from rest_framework import serializers
 from django.http import Http404
 
+from core.fast_serializers import CompiledListSerializer
+from core.sparse import SparseFieldsMixin, prepare_queryset, wants
 from core.models import (
     Category,
     Product,
-    Order,
     OrderItem,
     ProductTagConnector,
     ShippingAddress,
 )
+from store.context import get_customer, get_open_order
+from store.renditions import schedule_renditions
 
 
 class TagSerializer(serializers.Serializer):
@@ -18,8 +21,11 @@ class TagSerializer(serializers.Serializer):
     id = serializers.IntegerField(source='tag.id')
     title = serializers.CharField(source='tag.title')
 
+    class Meta:
+        list_serializer_class = CompiledListSerializer
 
-class ProductSerializer(serializers.Serializer):
+
+class ProductSerializer(SparseFieldsMixin, serializers.Serializer):
     # category = serializers.PrimaryKeyRelatedField(
     #     queryset=Category.objects.all())
     category_id = serializers.IntegerField()
@@ -27,10 +33,25 @@ class ProductSerializer(serializers.Serializer):
     id = serializers.IntegerField(read_only=True)
     name = serializers.CharField(max_length=100)
     price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    stock = serializers.IntegerField(
+        min_value=0, required=False, write_only=True)
     description = serializers.CharField(required=False)
     image = serializers.ImageField(
         required=False)
-    tags = TagSerializer(many=True, source='producttagconnector_set')
+    tags = TagSerializer(
+        many=True, source='producttagconnector_set', read_only=True)
+
+    class Meta:
+        list_serializer_class = CompiledListSerializer
+        expandable_fields = ('tags',)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """Load what serializing ``fields`` of the products needs."""
+        queryset = prepare_queryset(queryset, cls, fields, extra=('created',))
+        if wants(fields, 'tags'):
+            queryset = queryset.with_tags()
+        return queryset
     # tags = TagSerializer(source='producttagconnector_set__tag', many=True)
 
     # tags = serializers.SerializerMethodField()
@@ -61,19 +82,24 @@ class ProductSerializer(serializers.Serializer):
             category_id=validated_data['category_id'],
             name=validated_data['name'],
             price=validated_data['price'],
+            stock=validated_data.get('stock', 0),
             description=validated_data.get('description', ''),
             image=validated_data.get('image', None)
         )
+        schedule_renditions(product)
         return product
 
     def update(self, instance, validated_data):
         instance.category = validated_data.get('category', instance.category)
         instance.name = validated_data.get('name', instance.name)
         instance.price = validated_data.get('price', instance.price)
+        instance.stock = validated_data.get('stock', instance.stock)
         instance.description = validated_data.get(
             'description', instance.description)
         instance.image = validated_data.get('image', instance.image)
         instance.save()
+        if 'image' in validated_data:
+            schedule_renditions(instance)
         return instance
 
 
@@ -151,6 +177,48 @@ class OrderItemSerializer(serializers.Serializer):
         order_item = OrderItem.objects.create()
 
 
+class CartBatchItemSerializer(serializers.Serializer):
+    """Serializer for one product line of a batch cart update."""
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField()
+
+
+class CartBatchSerializer(serializers.Serializer):
+    """
+    Serializer for a batch cart update.
+
+    In ``absolute`` mode each quantity replaces the one in the cart and
+    must not be negative; in ``delta`` mode it is added to it.
+    """
+    MODES = ('absolute', 'delta')
+
+    mode = serializers.ChoiceField(choices=MODES, default='absolute')
+    items = CartBatchItemSerializer(many=True, allow_empty=False)
+
+    def validate(self, attrs):
+        absolute = attrs['mode'] == 'absolute'
+        quantities = {}
+        for item in attrs['items']:
+            product_id, quantity = item['product_id'], item['quantity']
+            if absolute and quantity < 0:
+                raise serializers.ValidationError(
+                    {'items': 'Quantities cannot be negative.'})
+            if product_id in quantities and absolute:
+                raise serializers.ValidationError(
+                    {'items': f'Product {product_id} is listed twice.'})
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+        found = Product.objects.only('id').in_bulk(list(quantities))
+        missing = sorted(set(quantities) - set(found))
+        if missing:
+            raise serializers.ValidationError(
+                {'items': f'Unknown products: '
+                          f'{", ".join(map(str, missing))}.'})
+
+        attrs['quantities'] = quantities
+        return attrs
+
+
 class CustomerCartSerializer(serializers.Serializer):
     """Serializer for product item in cart."""
     product_name = serializers.CharField(source='product.name')
@@ -165,13 +233,34 @@ class CustomerCartSerializer(serializers.Serializer):
 
     cart_price = serializers.SerializerMethodField()
 
+    class Meta:
+        list_serializer_class = CompiledListSerializer
+
     def get_cart_price(self, obj):
         if obj.product.discounted_price < 1:
             return obj.product.price * obj.quantity
         return obj.product.discounted_price * obj.quantity
 
 
-class OrderSerializer(serializers.Serializer):
+class OrderLineSerializer(serializers.Serializer):
+    """
+    Serializer for a line of an order.
+
+    Lines of placed orders show the name and price frozen at checkout.
+    """
+    product_id = serializers.IntegerField()
+    product_name = serializers.CharField(source='name')
+    item_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, source='unit_price')
+    quantity = serializers.IntegerField()
+    total = serializers.DecimalField(
+        max_digits=10, decimal_places=2, source='get_total')
+
+    class Meta:
+        list_serializer_class = CompiledListSerializer
+
+
+class OrderSerializer(SparseFieldsMixin, serializers.Serializer):
     """Serializer for Order."""
     # customer_id = serializers.IntegerField(read_only=True)
     customer_name = serializers.CharField(source='customer.name')
@@ -181,7 +270,21 @@ class OrderSerializer(serializers.Serializer):
     complete = serializers.BooleanField()
     cart_total = serializers.DecimalField(max_digits=10, decimal_places=2)
     paid_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
-    order_items = CustomerCartSerializer(many=True)
+    order_items = OrderLineSerializer(many=True)
+
+    class Meta:
+        list_serializer_class = CompiledListSerializer
+        expandable_fields = ('order_items',)
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """Load what serializing ``fields`` of the orders needs."""
+        queryset = prepare_queryset(queryset, cls, fields)
+        if wants(fields, 'cart_total'):
+            queryset = queryset.with_cart_total()
+        if wants(fields, 'order_items'):
+            queryset = queryset.with_items()
+        return queryset
 
 
 class ShippingAddressSerializer(serializers.Serializer):
@@ -193,9 +296,8 @@ class ShippingAddressSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         request = self.context.get('request')
-        customer = request.user.customer
-        order, created = Order.objects.get_or_create(
-            customer=customer, complete=False)
+        customer = get_customer(request)
+        order = get_open_order(request)
         # shipping_address = ShippingAddress.objects.create(
         #     customer=customer,
         #     order=order,
@@ -203,7 +305,9 @@ class ShippingAddressSerializer(serializers.Serializer):
         # )
 
         # return shipping_address
-        return ShippingAddress(customer=customer, order=order, **validated_data)
+        shipping_address, created = ShippingAddress.objects.update_or_create(
+            customer=customer, order=order, defaults=validated_data)
+        return shipping_address
 
     def update(self, instance, validated_data):
         instance.address = validated_data.get('address', instance.address)
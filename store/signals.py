@@ -0,0 +1,83 @@
+"""
+Signal handlers for the store app.
+"""
+from django.db.models.signals import post_delete, post_save
+
+from core.models import (
+    Category,
+    Discount,
+    Product,
+    ProductTagConnector,
+    Tag,
+)
+from store import search
+from store.catalog_cache import bump_catalog_version
+
+
+CATALOG_MODELS = (Category, Discount, Product, ProductTagConnector, Tag)
+
+
+def invalidate_catalog(sender, **kwargs):
+    """
+    Bump the catalog version whenever a catalog row changes.
+
+    The bump is part of the write's transaction, so the new version is
+    committed together with the data.
+    """
+    bump_catalog_version()
+
+
+def reset_category_discount(sender, instance, **kwargs):
+    """Restore regular prices once a category discount is deleted."""
+    Product.objects.filter(
+        category_id=instance.category_id).apply_discount(0)
+
+
+def index_product(sender, instance, **kwargs):
+    """Refresh the search document of a saved product."""
+    search.index_products([instance.pk])
+
+
+def unindex_product(sender, instance, **kwargs):
+    """Drop a deleted product from the search index."""
+    search.remove_products([instance.pk])
+
+
+def index_tagged_products(sender, instance, **kwargs):
+    """Refresh the products a tag is attached to after a tag change."""
+    product_ids = ProductTagConnector.objects.filter(
+        tag_id=instance.pk).values_list('product_id', flat=True)
+    search.index_products(product_ids)
+
+
+def index_connected_product(sender, instance, **kwargs):
+    """Refresh a product after a tag is attached to or detached from it."""
+    search.index_products([instance.product_id])
+
+
+def connect_signals():
+    """Connect the store signal handlers."""
+    post_delete.connect(
+        reset_category_discount, sender=Discount,
+        dispatch_uid='store.discount.delete')
+    for model in CATALOG_MODELS:
+        post_save.connect(
+            invalidate_catalog, sender=model,
+            dispatch_uid=f'store.catalog.save.{model.__name__}')
+        post_delete.connect(
+            invalidate_catalog, sender=model,
+            dispatch_uid=f'store.catalog.delete.{model.__name__}')
+
+    post_save.connect(
+        index_product, sender=Product, dispatch_uid='store.search.product')
+    post_delete.connect(
+        unindex_product, sender=Product,
+        dispatch_uid='store.search.product.delete')
+    post_save.connect(
+        index_tagged_products, sender=Tag, dispatch_uid='store.search.tag')
+    post_save.connect(
+        index_connected_product, sender=ProductTagConnector,
+        dispatch_uid='store.search.connector')
+    post_delete.connect(
+        index_connected_product, sender=ProductTagConnector,
+        dispatch_uid='store.search.connector.delete')
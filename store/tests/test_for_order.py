@@ -1,15 +1,35 @@
 """Test Case for Order."""
+import os
+import tempfile
+import threading
+import time
+
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import (
+    IntegrityError, OperationalError, connection, transaction)
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
 from decimal import Decimal
 
+from store import cart_store, checkout, context
 from core.models import (
+    IdempotencyKey,
     Order,
+    OrderEvent,
     Customer,
     Product,
     Category,
@@ -18,8 +38,20 @@ from core.models import (
 
 
 ORDER_URL = reverse('store:order')
+CART_URL = reverse('store:cart_items')
+CART_BATCH_URL = reverse('store:cart_batch')
+PLACE_ORDER_URL = reverse('store:place_order')
 SHIPPING_URL = reverse('store:shipping_address')
 
+# A cache shared by processes, as the cart store requires.
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'store-test-cache'),
+    },
+}
+
 
 def order_update(product_id, action='add'):
     """Create and return url."""
@@ -127,3 +159,612 @@ class OrderCustomerTest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
         self.assertEqual(response.data, shipping_address.data)
+
+    def test_order_list_reads_price_snapshots(self):
+        """Test placed orders keep their checkout prices and totals."""
+        category = Category.objects.create(name='Electronic')
+        regular = Product.objects.create(
+            name='Hp Elitebook 840 G1',
+            price=Decimal('500.50'),
+            category=category,
+            stock=10,
+        )
+        discounted = Product.objects.create(
+            name='SurfaceBook 2',
+            price=Decimal('1000.00'),
+            discounted_price=Decimal('800.00'),
+            category=category,
+            stock=10,
+        )
+        for _ in range(3):
+            order = Order.objects.open_for(self.customer)
+            OrderItem.objects.create(
+                order=order, product=regular, quantity=2)
+            OrderItem.objects.create(
+                order=order, product=discounted, quantity=1)
+            checkout.place_order(self.customer)
+        Product.objects.update(
+            name='Renamed', price=Decimal('1.00'), discounted_price=0)
+
+        with self.assertNumQueries(4):
+            response = self.client.get(ORDER_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 3)
+        for order in response.data:
+            self.assertEqual(Decimal(order['cart_total']), Decimal('1801.00'))
+            lines = {
+                line['product_name']: (line['item_price'], line['total'])
+                for line in order['order_items']
+            }
+            self.assertEqual(lines, {
+                'Hp Elitebook 840 G1': ('500.50', '1001.00'),
+                'SurfaceBook 2': ('800.00', '800.00'),
+            })
+
+    def test_order_list_open_order_uses_current_prices(self):
+        """Test the open order is totalled from current prices."""
+        category = Category.objects.create(name='Electronic')
+        product = Product.objects.create(
+            name='Hp Elitebook 840 G1',
+            price=Decimal('500.50'),
+            category=category,
+        )
+        order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.create(order=order, product=product, quantity=2)
+
+        with self.assertNumQueries(5):
+            response = self.client.get(ORDER_URL)
+
+        self.assertEqual(Decimal(response.data[0]['cart_total']),
+                         Decimal('1001.00'))
+        self.assertEqual(
+            response.data[0]['order_items'][0]['item_price'],
+            '500.50')
+
+    def test_order_list_conditional_get(self):
+        """Test an unchanged order list answers 304 Not Modified."""
+        category = Category.objects.create(name='Electronic')
+        product = Product.objects.create(
+            name='Hp Elitebook 840 G1',
+            price=Decimal('500.50'),
+            category=category,
+        )
+        response = self.client.get(ORDER_URL)
+        etag = response['ETag']
+
+        with self.assertNumQueries(2):
+            response = self.client.get(ORDER_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post(order_update(product.id))
+        response = self.client.get(ORDER_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_order_list_without_order_items(self):
+        """Test ?expand= with no relation leaves order lines out."""
+        category = Category.objects.create(name='Electronic')
+        product = Product.objects.create(
+            name='Hp Elitebook 840 G1',
+            price=Decimal('500.50'),
+            category=category,
+        )
+        order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.create(order=order, product=product, quantity=2)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(ORDER_URL, {'expand': ''})
+
+        self.assertNotIn('order_items', response.data[0])
+        self.assertEqual(Decimal(response.data[0]['cart_total']),
+                         Decimal('1001.00'))
+
+
+@override_settings(CACHES=SHARED_CACHES, CART_STORE={
+    'ENABLED': True, 'CACHE': 'shared',
+    'FLUSH_THRESHOLD': 5, 'FLUSH_INTERVAL': 3600})
+class CartStoreTest(TestCase):
+    """Tests for the write-behind cart store."""
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.client = APIClient()
+        self.user = create_user(
+            email='test@example.com', password='testpass123')
+        self.customer = Customer.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Electronic')
+        self.product = Product.objects.create(
+            name='Hp Elitebook 840 G1',
+            price=Decimal('500.50'),
+            category=category,
+        )
+
+    def test_cart_updates_are_deferred(self):
+        """Test cart updates do not write order rows until flushed."""
+        for _ in range(3):
+            response = self.client.post(order_update(self.product.id))
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.post(order_update(self.product.id, 'remove'))
+
+        self.assertFalse(OrderItem.objects.exists())
+
+        response = self.client.get(CART_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['cart_items'][0]['quantity'], 2)
+        self.assertEqual(OrderItem.objects.get().quantity, 2)
+
+    def test_cart_flushes_at_threshold(self):
+        """Test pending updates are written once the threshold is hit."""
+        for _ in range(5):
+            self.client.post(order_update(self.product.id))
+
+        self.assertEqual(OrderItem.objects.get().quantity, 5)
+
+    def test_flush_carts_command(self):
+        """Test the flush_carts command writes every pending cart."""
+        self.client.post(order_update(self.product.id))
+        self.client.post(order_update(self.product.id))
+
+        call_command('flush_carts', stdout=StringIO())
+
+        self.assertEqual(OrderItem.objects.get().quantity, 2)
+
+    def test_removing_last_item_deletes_line(self):
+        """Test a cart line reaching zero is deleted on flush."""
+        order = Order.objects.create(customer=self.customer)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1)
+
+        self.client.post(order_update(self.product.id, 'remove'))
+        self.client.get(CART_URL)
+
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_per_process_cache_refused(self):
+        """Test the store cannot be enabled on a per-process cache."""
+        for alias in (None, 'default'):
+            with self.settings(CART_STORE={'ENABLED': True, 'CACHE': alias}):
+                with self.assertRaises(ImproperlyConfigured):
+                    cart_store.is_enabled()
+
+    def test_pending_customer_ids(self):
+        """Test carts with pending changes are found by customer."""
+        self.client.post(order_update(self.product.id))
+
+        self.assertEqual(
+            cart_store.pending_customer_ids([self.customer.pk, 0]),
+            {self.customer.pk})
+
+    def test_lock_release_keeps_foreign_lock(self):
+        """Test an expired lock taken over by another caller is kept."""
+        key = 'cart:pending:lock-test'
+        with cart_store._locked(key) as shared:
+            shared.set(f'{key}:lock', 'other', cart_store.LOCK_TIMEOUT)
+
+        self.assertEqual(shared.get(f'{key}:lock'), 'other')
+
+    def test_busy_cart_written_through(self):
+        """Test a change is written directly when the lock is held."""
+        key = cart_store._pending_key(self.customer.pk)
+        caches['shared'].add(f'{key}:lock', 'other', 60)
+
+        with patch.object(cart_store, 'LOCK_TIMEOUT', 0.01):
+            self.client.post(order_update(self.product.id))
+
+        self.assertEqual(OrderItem.objects.get().quantity, 1)
+
+
+class CartBatchTest(TestCase):
+    """Tests for the batch cart endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='test@example.com', password='testpass123')
+        self.customer = Customer.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Electronic')
+        self.products = [
+            Product.objects.create(
+                name=f'Product {index}', price=Decimal('10.00'),
+                category=category)
+            for index in range(12)
+        ]
+        self.order = Order.objects.create(customer=self.customer)
+
+    def _quantities(self):
+        return dict(OrderItem.objects.filter(order=self.order).values_list(
+            'product_id', 'quantity'))
+
+    def test_absolute_batch(self):
+        """Test absolute quantities create, replace and delete lines."""
+        first, second, third = self.products[:3]
+        OrderItem.objects.create(order=self.order, product=first, quantity=5)
+        OrderItem.objects.create(order=self.order, product=second, quantity=1)
+        payload = {'items': [
+            {'product_id': first.id, 'quantity': 2},
+            {'product_id': second.id, 'quantity': 0},
+            {'product_id': third.id, 'quantity': 3},
+        ]}
+
+        response = self.client.post(CART_BATCH_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._quantities(), {first.id: 2, third.id: 3})
+        self.assertEqual(len(response.data['cart_items']), 2)
+        self.assertEqual(response.data['total'], Decimal('50.00'))
+
+    def test_delta_batch(self):
+        """Test delta quantities are added to the cart."""
+        first, second = self.products[:2]
+        OrderItem.objects.create(order=self.order, product=first, quantity=5)
+        payload = {'mode': 'delta', 'items': [
+            {'product_id': first.id, 'quantity': -2},
+            {'product_id': second.id, 'quantity': 1},
+            {'product_id': second.id, 'quantity': 1},
+        ]}
+
+        response = self.client.post(CART_BATCH_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._quantities(), {first.id: 3, second.id: 2})
+
+    def test_batch_queries_are_bounded(self):
+        """Test the number of queries does not grow with the batch."""
+        def post(products):
+            payload = {'items': [
+                {'product_id': product.id, 'quantity': 1}
+                for product in products
+            ]}
+            return self.client.post(CART_BATCH_URL, payload, format='json')
+
+        OrderItem.objects.create(
+            order=self.order, product=self.products[0], quantity=1)
+        with self.assertNumQueries(13):
+            post(self.products[:2])
+        with self.assertNumQueries(13):
+            post(self.products)
+
+    def test_batch_rejects_unknown_products(self):
+        """Test a batch with a missing product changes nothing."""
+        payload = {'items': [
+            {'product_id': self.products[0].id, 'quantity': 1},
+            {'product_id': 9999, 'quantity': 1},
+        ]}
+
+        response = self.client.post(CART_BATCH_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._quantities(), {})
+
+    def test_batch_rejects_negative_absolute_quantity(self):
+        """Test absolute mode rejects negative quantities."""
+        payload = {'items': [
+            {'product_id': self.products[0].id, 'quantity': -1}]}
+
+        response = self.client.post(CART_BATCH_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CustomerContextTest(TestCase):
+    """Tests for resolving the customer and open order of a request."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(
+            email='test@example.com', password='testpass123')
+        self.customer = Customer.objects.create(user=self.user)
+        self.order = Order.objects.create(customer=self.customer)
+
+    def _request(self):
+        """Return a request of a user loaded without its customer."""
+        return SimpleNamespace(user=get_user_model().objects.get(
+            pk=self.user.pk))
+
+    def test_open_order_and_customer_in_one_query(self):
+        """Test the customer is loaded together with the open order."""
+        request = self._request()
+
+        with self.assertNumQueries(1):
+            order = context.get_open_order(request)
+            customer = context.get_customer(request)
+            self.assertEqual(context.get_open_order(request), order)
+
+        self.assertEqual(order, self.order)
+        self.assertEqual(customer, self.customer)
+
+    def test_placed_order_is_not_reused(self):
+        """Test a new open order is resolved once the cached one is placed."""
+        context.get_open_order(self._request())
+        Order.objects.filter(pk=self.order.pk).update(complete=True)
+
+        order = context.get_open_order(self._request())
+
+        self.assertNotEqual(order, self.order)
+        self.assertFalse(order.complete)
+        self.assertEqual(order.customer, self.customer)
+
+    def test_customer_created_for_new_user(self):
+        """Test a user without a customer gets one and an open order."""
+        user = create_user(email='new@example.com', password='testpass123')
+
+        order = context.get_open_order(SimpleNamespace(user=user))
+
+        self.assertEqual(order.customer.user, user)
+
+
+class CheckoutTest(TestCase):
+    """Tests for placing an order."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='test@example.com', password='testpass123')
+        self.customer = Customer.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Electronic')
+        self.laptop = Product.objects.create(
+            name='Hp Elitebook 840 G1', price=Decimal('500.50'),
+            category=category, stock=5)
+        self.phone = Product.objects.create(
+            name='Pixel 7', price=Decimal('600.00'),
+            discounted_price=Decimal('550.00'), category=category, stock=1)
+        self.order = Order.objects.create(customer=self.customer)
+
+    def test_place_order_reserves_stock(self):
+        """Test checkout decrements stock and computes the amount paid."""
+        OrderItem.objects.create(
+            order=self.order, product=self.laptop, quantity=2)
+        OrderItem.objects.create(
+            order=self.order, product=self.phone, quantity=1)
+
+        response = self.client.post(
+            PLACE_ORDER_URL, {'amount': '1.00'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['paid_amount'], '1551.00')
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.complete)
+        self.assertEqual(self.order.order_status, 'Confirmed')
+        self.assertEqual(self.order.paid_amount, Decimal('1551.00'))
+        self.laptop.refresh_from_db()
+        self.phone.refresh_from_db()
+        self.assertEqual((self.laptop.stock, self.phone.stock), (3, 0))
+        event = OrderEvent.objects.get(order=self.order)
+        self.assertEqual(
+            (event.from_status, event.to_status), ('Pending', 'Confirmed'))
+
+    def test_place_order_insufficient_stock(self):
+        """Test a short product fails the whole checkout."""
+        OrderItem.objects.create(
+            order=self.order, product=self.laptop, quantity=2)
+        OrderItem.objects.create(
+            order=self.order, product=self.phone, quantity=2)
+
+        response = self.client.post(PLACE_ORDER_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['products'], [self.phone.id])
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.complete)
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.stock, 5)
+        self.assertFalse(OrderEvent.objects.exists())
+
+    def test_place_order_empty_cart(self):
+        """Test an empty cart cannot be placed."""
+        response = self.client.post(PLACE_ORDER_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IdempotencyTest(TestCase):
+    """Tests for the Idempotency-Key header."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='test@example.com', password='testpass123')
+        self.customer = Customer.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+        category = Category.objects.create(name='Electronic')
+        self.product = Product.objects.create(
+            name='Hp Elitebook 840 G1', price=Decimal('500.50'),
+            category=category, stock=5)
+
+    def test_cart_update_replay_is_not_applied_twice(self):
+        """Test a retried cart update returns the stored response."""
+        url = order_update(self.product.id)
+
+        first = self.client.post(url, HTTP_IDEMPOTENCY_KEY='tap-1')
+        with self.assertNumQueries(1):
+            replay = self.client.post(url, HTTP_IDEMPOTENCY_KEY='tap-1')
+        self.client.post(url, HTTP_IDEMPOTENCY_KEY='tap-2')
+
+        self.assertEqual(replay.status_code, first.status_code)
+        self.assertEqual(replay.data, first.data)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(OrderItem.objects.get().quantity, 2)
+
+    def test_place_order_replay(self):
+        """Test a retried checkout does not reserve stock again."""
+        url = order_update(self.product.id)
+        self.client.post(url)
+
+        first = self.client.post(PLACE_ORDER_URL, HTTP_IDEMPOTENCY_KEY='buy')
+        replay = self.client.post(PLACE_ORDER_URL, HTTP_IDEMPOTENCY_KEY='buy')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay.data['order'], first.data['order'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 4)
+
+    def test_key_reused_with_another_body(self):
+        """Test reusing a key for a different request is rejected."""
+        payload = {'address': 'Lalmatia', 'city': 'Dhaka',
+                   'postal_code': '1230'}
+        self.client.post(SHIPPING_URL, payload, format='json',
+                         HTTP_IDEMPOTENCY_KEY='address')
+
+        payload['city'] = 'Khulna'
+        response = self.client.post(SHIPPING_URL, payload, format='json',
+                                    HTTP_IDEMPOTENCY_KEY='address')
+
+        self.assertEqual(response.status_code,
+                         status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_keys_are_scoped_to_the_user(self):
+        """Test another user's request with the same key runs."""
+        url = order_update(self.product.id)
+        self.client.post(url, HTTP_IDEMPOTENCY_KEY='tap')
+        other = create_user(email='other@example.com', password='pass12345')
+        Customer.objects.create(user=other)
+        self.client.force_authenticate(other)
+
+        response = self.client.post(url, HTTP_IDEMPOTENCY_KEY='tap')
+
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(OrderItem.objects.count(), 2)
+
+    def test_key_in_progress(self):
+        """Test a replay of a running request gets 409 until it is stale."""
+        url = order_update(self.product.id)
+        self.client.post(url, HTTP_IDEMPOTENCY_KEY='tap')
+        IdempotencyKey.objects.update(status=None)
+
+        response = self.client.post(url, HTTP_IDEMPOTENCY_KEY='tap')
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        IdempotencyKey.objects.update(
+            created=timezone.now() - timedelta(minutes=5))
+        response = self.client.post(url, HTTP_IDEMPOTENCY_KEY='tap')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(OrderItem.objects.get().quantity, 2)
+
+
+class CartConcurrencyTest(TransactionTestCase):
+    """Tests for concurrent updates of one cart."""
+
+    def setUp(self):
+        self.user = create_user(
+            email='test@example.com', password='testpass123')
+        self.customer = Customer.objects.create(user=self.user)
+        category = Category.objects.create(name='Electronic')
+        self.products = [
+            Product.objects.create(
+                name=f'Product {index}', price=Decimal('10.00'),
+                category=category)
+            for index in range(2)
+        ]
+
+    def _run_concurrently(self, works, taps=1):
+        """Run each of ``works`` ``taps`` times in its own thread."""
+        errors = []
+
+        def run(work):
+            try:
+                for _ in range(taps):
+                    # SQLite allows one writer at a time; an operation that
+                    # hit a lock rolled back as a whole and is safe to retry.
+                    for _ in range(100):
+                        try:
+                            with transaction.atomic():
+                                work()
+                            break
+                        except OperationalError:
+                            time.sleep(0.01)
+                    else:
+                        raise AssertionError('Database stayed locked.')
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=run, args=(work,)) for work in works]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+
+    def _hammer(self, threads, taps, work):
+        """Run ``work`` ``taps`` times in each of ``threads`` threads."""
+        self._run_concurrently([work] * threads, taps)
+
+    def test_concurrent_adds_are_not_lost(self):
+        """Test many threads adding to one cart give exact quantities."""
+        def add():
+            order = Order.objects.open_for(self.customer)
+            for product in self.products:
+                OrderItem.objects.adjust_quantity(order, product.id, 1)
+
+        self._hammer(threads=8, taps=10, work=add)
+
+        self.assertEqual(
+            Order.objects.filter(
+                customer=self.customer, complete=False).count(), 1)
+        items = OrderItem.objects.order_by('product_id')
+        self.assertEqual([item.quantity for item in items], [80, 80])
+
+    def test_concurrent_add_and_remove(self):
+        """Test interleaved adds and removes net out exactly."""
+        order = Order.objects.open_for(self.customer)
+        product = self.products[0]
+        OrderItem.objects.create(order=order, product=product, quantity=50)
+
+        def add_then_remove():
+            OrderItem.objects.adjust_quantity(order, product.id, 1)
+            OrderItem.objects.adjust_quantity(order, product.id, -1)
+
+        self._hammer(threads=6, taps=10, work=add_then_remove)
+
+        self.assertEqual(OrderItem.objects.get().quantity, 50)
+
+    def test_one_open_order_per_customer(self):
+        """Test a second open order for a customer is rejected."""
+        Order.objects.create(customer=self.customer)
+        Order.objects.create(customer=self.customer, complete=True)
+
+        with self.assertRaises(IntegrityError):
+            Order.objects.create(customer=self.customer)
+
+    def test_concurrent_checkouts_do_not_oversell(self):
+        """Test parallel checkouts never take more than the stock."""
+        product = self.products[0]
+        product.stock = 5
+        product.save()
+        customers = []
+        for index in range(12):
+            user = create_user(
+                email=f'buyer{index}@example.com', password='testpass123')
+            customer = Customer.objects.create(user=user)
+            order = Order.objects.create(customer=customer)
+            OrderItem.objects.create(order=order, product=product, quantity=1)
+            customers.append(customer)
+
+        placed, short = [], []
+
+        def buy(customer):
+            def work():
+                try:
+                    checkout.place_order(customer)
+                    placed.append(customer.pk)
+                except checkout.InsufficientStock:
+                    short.append(customer.pk)
+            return work
+
+        self._run_concurrently([buy(customer) for customer in customers])
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(len(placed), 5)
+        self.assertEqual(len(short), 7)
+        self.assertEqual(Order.objects.filter(complete=True).count(), 5)
@@ -3,13 +3,16 @@ Test for Products APIs.
 """
 import tempfile
 import os
+from unittest.mock import patch
 from PIL import Image
 
 from decimal import Decimal
 from rest_framework.authtoken.models import Token
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
@@ -17,8 +20,13 @@ from rest_framework.test import APIClient
 from core.models import (
     Category,
     Product,
+    ProductTagConnector,
+    Tag,
 )
 
+from core.pagination import encode_cursor
+from store import renditions
+from store.catalog_cache import clear_local_cache, get_catalog_version
 from store.serializers import (
     CategorySerializer,
     ProductSerializer,
@@ -27,6 +35,7 @@ from store.serializers import (
 PRODUCT_URL = reverse('store:products')
 CATEGORY_URL = reverse('store:category')
 PRODUCT_CREATE_URL = reverse('admin_user:product-admin')
+SEARCH_URL = reverse('store:search')
 
 
 def detail_url(category_id):
@@ -98,6 +107,164 @@ class PublicProductAPITest(TestCase):
         serializer = ProductSerializer(products, many=True)
         self.assertEqual(response.data['products'], serializer.data)
 
+    def test_list_serialization_matches_single_objects(self):
+        """Test the compiled list path matches per-object serialization."""
+        tag = Tag.objects.create(title='Sale', description='')
+        p1 = create_product(description=None)
+        create_product(name='SurfaceBook 2')
+        ProductTagConnector.objects.create(tag=tag, product=p1)
+        products = Product.objects.with_tags().order_by('id')
+
+        expected = [ProductSerializer(product).data for product in products]
+
+        self.assertEqual(ProductSerializer(products, many=True).data, expected)
+
+    def test_list_of_products_cursor_pagination(self):
+        """Test walking the product list with keyset cursors."""
+        for index in range(7):
+            create_product(name=f'Product {index}')
+
+        response = self.client.get(
+            PRODUCT_URL, {'pagination': 'cursor', 'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['prev'])
+        first_page = [p['name'] for p in response.data['products']]
+        self.assertEqual(first_page, ['Product 6', 'Product 5', 'Product 4'])
+
+        seen = list(first_page)
+        cursor = response.data['next']
+        while cursor:
+            response = self.client.get(
+                PRODUCT_URL, {'cursor': cursor, 'page_size': 3})
+            seen += [p['name'] for p in response.data['products']]
+            cursor = response.data['next']
+
+        self.assertEqual(seen, [f'Product {i}' for i in range(6, -1, -1)])
+
+        response = self.client.get(
+            PRODUCT_URL, {'cursor': response.data['prev'], 'page_size': 3})
+        self.assertEqual(
+            [p['name'] for p in response.data['products']],
+            ['Product 3', 'Product 2', 'Product 1'],
+        )
+
+    def test_list_of_products_invalid_cursor(self):
+        """Test a malformed cursor is rejected."""
+        response = self.client.get(PRODUCT_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_of_products_cursor_with_invalid_values(self):
+        """Test a cursor holding values of the wrong type is rejected."""
+        cursor = encode_cursor(['garbage', 1], 'next')
+
+        response = self.client.get(PRODUCT_URL, {'cursor': cursor})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cursor', response.data)
+
+        """Test repeated catalog reads only look up the catalog version."""
+        """Test repeated catalog reads are served without SQL."""
+        create_product()
+        self.client.get(PRODUCT_URL)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(PRODUCT_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['products']), 1)
+
+    def test_catalog_cache_invalidated_by_write(self):
+        """Test a catalog write is visible on the next read."""
+        p1 = create_product()
+        url = detail_url_for_product(p1.id)
+        self.client.get(url)
+
+        p1.name = 'Product name changed'
+        p1.save()
+        response = self.client.get(url)
+
+        self.assertEqual(response.data['name'], 'Product name changed')
+
+    def test_catalog_version_shared_by_workers(self):
+        """Test the catalog version is read from the database."""
+        version = get_catalog_version()
+        clear_local_cache()
+        cache.clear()
+
+        self.assertEqual(get_catalog_version(), version)
+        create_product()
+        self.assertNotEqual(get_catalog_version(), version)
+
+    def test_catalog_conditional_get(self):
+        """Test an unchanged catalog answers 304 Not Modified."""
+        p1 = create_product()
+        response = self.client.get(PRODUCT_URL)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(PRODUCT_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        p1.price = Decimal('250.00')
+        p1.save()
+        response = self.client.get(PRODUCT_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_of_products_sparse_fields(self):
+        """Test ?fields= trims the payload and the query."""
+        p1 = create_product()
+        tag = Tag.objects.create(title='Sale', description='')
+        ProductTagConnector.objects.create(tag=tag, product=p1)
+
+        with self.assertNumQueries(3) as queries:
+            response = self.client.get(
+                PRODUCT_URL, {'fields': 'id,name,price'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(response.data['products'][0]), ['id', 'name', 'price'])
+        self.assertNotIn('description', queries.captured_queries[1]['sql'])
+
+        response = self.client.get(
+            PRODUCT_URL, {'fields': 'id', 'expand': 'tags'})
+        self.assertEqual(response.data['products'][0]['tags'],
+                         [{'id': tag.id, 'title': 'Sale'}])
+
+    def test_list_of_products_unknown_field(self):
+        """Test requesting an unknown field is rejected."""
+        response = self.client.get(PRODUCT_URL, {'fields': 'id,secret'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_products(self):
+        """Test searching products by name, description and tag."""
+        laptop = create_product(name='Gaming Laptop', description='Fast')
+        create_product(name='Office Chair', description='Laptop friendly')
+        create_product(name='Desk Lamp', description='Bright')
+        tag = Tag.objects.create(title='Ergonomic', description='')
+        chair = Product.objects.get(name='Office Chair')
+        ProductTagConnector.objects.create(tag=tag, product=chair)
+
+        response = self.client.get(SEARCH_URL, {'q': 'lapt'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        names = [p['name'] for p in response.data['products']]
+        self.assertEqual(names, ['Gaming Laptop', 'Office Chair'])
+
+        response = self.client.get(SEARCH_URL, {'q': 'ergonomic'})
+        names = [p['name'] for p in response.data['products']]
+        self.assertEqual(names, ['Office Chair'])
+
+        laptop.delete()
+        response = self.client.get(SEARCH_URL, {'q': 'gaming'})
+        self.assertEqual(response.data['products'], [])
+
+    def test_search_requires_query(self):
+        """Test searching without a query fails."""
+        response = self.client.get(SEARCH_URL)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_list_product_by_category(self):
         """Test displaying the products based on Category."""
         c1 = Category.objects.create(
@@ -122,8 +289,34 @@ class PublicProductAPITest(TestCase):
         s2 = ProductSerializer(p2)
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIn(s2.data, response.data)
-        self.assertNotIn(s1.data, response.data)
+        self.assertIn(s2.data, response.data['products'])
+        self.assertNotIn(s1.data, response.data['products'])
+
+    def test_list_product_by_category_paginated(self):
+        """Test products of a category are paginated with tags prefetched."""
+        category = Category.objects.create(name='IT')
+        tag = Tag.objects.create(title='Sale', description='')
+        for index in range(7):
+            product = create_product(
+                name=f'Product {index}', category_id=category.id)
+            ProductTagConnector.objects.create(tag=tag, product=product)
+
+        url = detail_url(category.id)
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'page_size': 3, 'page': 2})
+
+        self.assertEqual(response.data['page'], 2)
+        self.assertEqual(response.data['pages'], 3)
+        self.assertEqual(
+            [p['name'] for p in response.data['products']],
+            ['Product 3', 'Product 2', 'Product 1'],
+        )
+
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                url, {'pagination': 'cursor', 'page_size': 3})
+        self.assertEqual(len(response.data['products']), 3)
+        self.assertIsNotNone(response.data['next'])
 
     def test_retrieve_individual_product(self):
         """Test retriving asingle product by id."""
@@ -150,6 +343,18 @@ class PublicProductAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(s1.data, response.data)
 
+    def test_catalog_omits_stock(self):
+        """Test stock levels are not part of the public catalog."""
+        product = create_product()
+        Product.objects.filter(pk=product.pk).update(stock=5)
+
+        response = self.client.get(detail_url_for_product(product.id))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('stock', response.data)
+        response = self.client.get(PRODUCT_URL)
+        self.assertNotIn('stock', response.data['products'][0])
+
     def test_post_is_not_allowed_in_product(self):
         """Test You cant't update product only admin can."""
         p1 = create_product()
@@ -232,6 +437,54 @@ class PrivateProductAPITests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['price'], payload['price'])
 
+    def test_create_product_without_tags(self):
+        """Test a product is created from a multipart form without tags."""
+        category = Category.objects.create(name='Electronics')
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file, \
+                self.settings(MEDIA_ROOT=media.name):
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            payload = {
+                'name': 'Hp Elitebook 840 G1',
+                'price': '500.50',
+                'category_id': category.id,
+                'image': image_file,
+            }
+            with patch.object(renditions, '_executor'):
+                response = self.client.post(
+                    PRODUCT_CREATE_URL, payload, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['tags'], [])
+
+    def test_product_stock_set_by_admin(self):
+        """Test admins set the stock of new and existing products."""
+        category = Category.objects.create(name='Electronics')
+        payload = {
+            'name': 'Hp Elitebook 840 G1',
+            'price': '500.50',
+            'category_id': category.id,
+            'stock': 7,
+        }
+
+        response = self.client.post(
+            PRODUCT_CREATE_URL, payload, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        product = Product.objects.get(pk=response.data['id'])
+        self.assertEqual(product.stock, 7)
+
+        url = detail_url_for_product_admin(product.id)
+        response = self.client.patch(url, {'stock': 3}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 3)
+        response = self.client.patch(url, {'stock': -1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_product_delete_by_admin(self):
         """Test deleting a product."""
         p1 = create_product()
@@ -260,3 +513,68 @@ class PrivateProductAPITests(TestCase):
         products = Product.objects.all()
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertEqual(products.count(), 0)
+
+
+class ProductRenditionTests(TestCase):
+    """Test eager generation of product image renditions."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings = override_settings(MEDIA_ROOT=media.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            email='admin@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Electronics')
+
+    def _rendition_paths(self, name):
+        image = Product(image=name).image
+        image.create_on_demand = False
+        return [
+            renditions._rendition(image, size_key).name
+            for size_key in renditions.size_keys()
+        ]
+
+    def test_upload_creates_renditions(self):
+        """Test an uploaded image has every rendition once committed."""
+        product = create_product()
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (900, 900)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            with patch.object(renditions, '_executor') as executor:
+                executor.submit.side_effect = lambda work, *args: work(*args)
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.patch(
+                        detail_url_for_product_admin(product.id),
+                        {'image': image_file}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        name = Product.objects.get().image.name
+        paths = self._rendition_paths(name)
+        self.assertEqual(len(paths), 6)
+        for path in paths:
+            self.assertTrue(default_storage.exists(path), path)
+
+    def test_warm_image_skips_present_renditions(self):
+        """Test renditions already stored are not created again."""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (900, 900)).save(image_file, format='JPEG')
+            name = default_storage.save('product/phone.jpg', image_file)
+
+        self.assertEqual(renditions.warm_image(name), (6, 0, 0))
+        self.assertEqual(renditions.warm_image(name), (0, 6, 0))
+
+    def test_update_without_image_schedules_nothing(self):
+        """Test product edits that keep the image do not resize it."""
+        product = create_product()
+
+        with patch.object(renditions, '_executor') as executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(
+                    detail_url_for_product_admin(product.id),
+                    {'name': 'Renamed'}, format='json')
+
+        executor.submit.assert_not_called()
@@ -9,6 +9,7 @@ app_name = 'store'
 urlpatterns = [
     path('categories/', views.CategoryList.as_view(), name='category'),
     path('product/', views.ProductList.as_view(), name='products'),
+    path('search/', views.ProductSearch.as_view(), name='search'),
     path('product-detail/<int:product_id>/',
          views.ProductDetail.as_view(), name='product-detail'),
     path('product-category/<int:category_id>/',
@@ -17,6 +18,7 @@ urlpatterns = [
     path('order-cart/<int:pk>/<str:action>/',
          views.UpdateCart.as_view(), name='add-to-cart'),
     path('cart-items/', views.CustomerCart.as_view(), name='cart_items'),
+    path('cart/batch/', views.CartBatch.as_view(), name='cart_batch'),
     path('place-order/', views.PlaceOrder.as_view(), name='place_order'),
     path('shipping-address/', views.ShippingAddressDetail.as_view(),
          name='shipping_address')
@@ -1,28 +1,32 @@
 """
 Views for our Ecommerce Store.
 """
+from django.db import transaction
+from django.db.models import Count, Max
 from django.http import Http404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.decorators import permission_classes
 from rest_framework import authentication
+from rest_framework import serializers
 from rest_framework import status
-from django.core.paginator import (
-    Paginator,
-    EmptyPage,
-    Page,
-    PageNotAnInteger
-)
 
 from core.models import (
     Category,
     Product,
     Order,
     OrderItem,
-    Customer,
     ShippingAddress,
+    load_cart_products,
 )
+from core.conditional import make_etag, not_modified, with_etag
+from core.idempotency import idempotent
+from core.pagination import get_page_size, paginated_response_data
+from core.sparse import requested_fields, wants
+from store import cart_store, checkout, search
+from store.catalog_cache import cache_catalog_response, get_catalog_version
+from store.context import CustomerContextMixin
 
 from .serializers import (
     CategorySerializer,
@@ -30,6 +34,7 @@ from .serializers import (
     OrderSerializer,
     OrderItemSerializer,
     CustomerCartSerializer,
+    CartBatchSerializer,
     ShippingAddressSerializer,
 )
 
@@ -39,6 +44,7 @@ class CategoryList(APIView):
 
     serializer_class = CategorySerializer
 
+    @cache_catalog_response
     def get(self, request):
         categories = Category.objects.filter().order_by('-id')
         serializer = self.serializer_class(categories, many=True)
@@ -51,33 +57,19 @@ class ProductList(APIView):
 
     serializer_class = ProductSerializer
 
+    @cache_catalog_response
     def get(self, request):
         # products = Product.objects.all().order_by('-id')
-        products = Product.objects.prefetch_related(
-            'producttagconnector_set__tag').filter()
+        fields = requested_fields(request, self.serializer_class)
+        products = self.serializer_class.setup_eager_loading(
+            Product.objects.all(), fields)
 
         """Adding Pagination."""
-        page = request.query_params.get('page')
-        paginator = Paginator(products, 5)
-
-        try:
-            products = paginator.page(page)
-        except PageNotAnInteger:
-            products = paginator.page(1)
-        except EmptyPage:
-            products = paginator.page(paginator.num_pages)
-
-        if page is None:
-            page = 1
-        page = int(page)
+        data = paginated_response_data(
+            products, request, self.serializer_class, 'products',
+            fields=fields)
 
-        serializer = self.serializer_class(products, many=True)
-
-        return Response({
-            'products': serializer.data,
-            'page': page,
-            'pages': paginator.num_pages
-        }, status=status.HTTP_200_OK)
+        return Response(data, status=status.HTTP_200_OK)
 
 
 class ProductListByCategory(APIView):
@@ -85,13 +77,55 @@ class ProductListByCategory(APIView):
 
     serializer_class = ProductSerializer
 
+    @cache_catalog_response
     def get(self, request, category_id):
 
-        products = Product.objects.filter(category__id=category_id)
+        fields = requested_fields(request, self.serializer_class)
+        products = self.serializer_class.setup_eager_loading(
+            Product.objects.filter(category_id=category_id), fields)
 
-        serializer = self.serializer_class(products, many=True)
+        data = paginated_response_data(
+            products, request, self.serializer_class, 'products',
+            fields=fields)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ProductSearch(APIView):
+    """Full-text search over product names, descriptions and tags."""
+
+    serializer_class = ProductSerializer
+
+    @cache_catalog_response
+    def get(self, request, format=None):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'q': 'This query parameter is required.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        page_size = get_page_size(request)
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+        except ValueError:
+            page = 1
+
+        product_ids = search.search_product_ids(
+            query, limit=page_size + 1, offset=(page - 1) * page_size)
+        has_next = len(product_ids) > page_size
+        product_ids = product_ids[:page_size]
+
+        fields = requested_fields(request, self.serializer_class)
+        products = self.serializer_class.setup_eager_loading(
+            Product.objects.all(), fields).in_bulk(product_ids)
+        serializer = self.serializer_class(
+            [products[pk] for pk in product_ids if pk in products],
+            many=True, fields=fields)
+
+        return Response({
+            'products': serializer.data,
+            'page': page,
+            'next': page + 1 if has_next else None,
+        }, status=status.HTTP_200_OK)
 
 
 class ProductDetail(APIView):
@@ -99,9 +133,12 @@ class ProductDetail(APIView):
 
     serializer_class = ProductSerializer
 
+    @cache_catalog_response
     def get(self, request, product_id, format=None):
-        product = Product.objects.get(id=product_id)
-        serializer = self.serializer_class(product, many=False)
+        fields = requested_fields(request, self.serializer_class)
+        product = self.serializer_class.setup_eager_loading(
+            Product.objects.all(), fields).get(id=product_id)
+        serializer = self.serializer_class(product, many=False, fields=fields)
 
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -109,7 +146,7 @@ class ProductDetail(APIView):
 # permission_classes[IsAdminUser]
 
 
-class CustomerOrder(APIView):
+class CustomerOrder(CustomerContextMixin, APIView):
     """Customer Order."""
     # authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [IsAuthenticated]
@@ -117,99 +154,152 @@ class CustomerOrder(APIView):
     serializer_class = OrderSerializer
 
     def get(self, request, format=None):
-        customer = request.user.customer
+        customer = self.get_customer()
+        if cart_store.is_enabled():
+            cart_store.flush(customer)
         # order, created = Order.objects.get_or_create(
         #     customer=customer, complete=False)
+        stamp = Order.objects.filter(customer=customer).aggregate(
+            count=Count('id'), updated=Max('updated'))
+        etag = make_etag(request, customer.id, stamp['count'],
+                         stamp['updated'], get_catalog_version())
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
         try:
             # order = Order.objects.get(customer=customer, complete=True)
-            orders = Order.objects.filter(customer=customer)
-            for order in orders:
-                order.get_cart_total()
+            fields = requested_fields(request, self.serializer_class)
+            orders = self.serializer_class.setup_eager_loading(
+                Order.objects.filter(customer=customer), fields)
+            if wants(fields, 'cart_total'):
+                for order in orders:
+                    order.get_cart_total()
+            if wants(fields, 'order_items'):
+                load_cart_products(orders)
             # order.get_cart_total()
 
             # serializer = self.serializer_class(order)
-            serializer = self.serializer_class(orders, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            serializer = self.serializer_class(
+                orders, many=True, fields=fields)
+            return with_etag(
+                Response(serializer.data, status=status.HTTP_200_OK), etag)
         except Order.DoesNotExist:
             return Response({'order': 'No Found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-class UpdateCart(APIView):
+class UpdateCart(CustomerContextMixin, APIView):
     """Add or remove item from the cart."""
 
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def post(self, request, pk, action, format=None):
         product = Product.objects.get(pk=pk)
-        customer, created = Customer.objects.get_or_create(user=request.user)
-        order, created = Order.objects.get_or_create(
-            customer=customer, complete=False)
-
-        order_item, created = OrderItem.objects.get_or_create(
-            order_id=order.id, product_id=product.id)
-
-        if action == 'add':
-            order_item.quantity = (order_item.quantity+1)
-        elif action == 'remove':
-            order_item.quantity = (order_item.quantity-1)
+        delta = {'add': 1, 'remove': -1}.get(action, 0)
+        if cart_store.is_enabled():
+            cart_store.record(self.get_customer(), product.id, delta)
+            return Response(
+                {'msg': 'Cart Updated.'}, status=status.HTTP_201_CREATED)
+
+        order = self.get_open_order()
+        OrderItem.objects.adjust_quantity(order, product.id, delta)
+        # Cart changes are part of the order's version stamp.
+        order.save(update_fields=['updated'])
+        return Response({'msg': 'Cart Updated.'}, status=status.HTTP_201_CREATED)
 
-        order_item.save()
 
-        if order_item.quantity <= 0:
-            order_item.delete()
-        return Response({'msg': 'Cart Updated.'}, status=status.HTTP_201_CREATED)
+def cart_response_data(order, serializer_class=CustomerCartSerializer):
+    """Return the cart payload of ``order``."""
+    order_items = OrderItem.objects.filter(
+        order=order).select_related('product')
+    serializer = serializer_class(order_items, many=True)
+    return {
+        'cart_items': serializer.data,
+        'total': order.get_cart_total(),
+    }
 
 
-class CustomerCart(APIView):
+class CustomerCart(CustomerContextMixin, APIView):
     """Sample CartItem View."""
 
     serializer_class = CustomerCartSerializer
 
     def get(self, request, format=None):
-        customer = Customer.objects.get(user=request.user)
-        order, created = Order.objects.get_or_create(
-            customer=customer, complete=False)
-        total = order.get_cart_total()
-        order_items = OrderItem.objects.filter(order=order)
-        serializer = self.serializer_class(order_items, many=True)
+        if cart_store.is_enabled():
+            cart_store.flush(self.get_customer())
+        order = self.get_open_order()
+        return Response(
+            cart_response_data(order, self.serializer_class),
+            status=status.HTTP_200_OK)
 
-        return Response({
-            'cart_items': serializer.data,
-            'total': total,
-        }, status=status.HTTP_200_OK)
 
+class CartBatch(CustomerContextMixin, APIView):
+    """Apply many cart changes in one request."""
 
-class PlaceOrder(APIView):
-    """Place and Complete an incomplete Order."""
+    serializer_class = CartBatchSerializer
+    permission_classes = [IsAuthenticated]
 
+    @idempotent
+    def post(self, request, format=None):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if cart_store.is_enabled():
+            cart_store.flush(self.get_customer())
+        with transaction.atomic():
+            order = self.get_open_order()
+            OrderItem.objects.apply_quantities(
+                order, serializer.validated_data['quantities'],
+                absolute=serializer.validated_data['mode'] == 'absolute')
+            order.save(update_fields=['updated'])
+        return Response(cart_response_data(order), status=status.HTTP_200_OK)
+
+
+class PlaceOrder(CustomerContextMixin, APIView):
+    """
+    Place and Complete an incomplete Order.
+
+    The amount paid is the cart total at current prices; an ``amount``
+    sent by the client is ignored.
+    """
+
+    throttle_scope = 'place_order'
+
+    @idempotent
     def post(self, request, format=None):
-        amount = request.data['amount']
-        customer = Customer.objects.get(user=request.user)
-        order, created = Order.objects.get_or_create(
-            customer=customer, complete=False)
-        order.paid_amount = amount
-        order.complete = True
-        order.order_status = 'Confirmed'
-        order.save()
+        customer = self.get_customer()
+        if cart_store.is_enabled():
+            cart_store.flush(customer)
+        try:
+            order = checkout.place_order(customer)
+        except checkout.InsufficientStock as error:
+            return Response(
+                {'msg': 'Insufficient stock.',
+                 'products': error.product_ids},
+                status=status.HTTP_409_CONFLICT)
+        except checkout.EmptyCart as error:
+            return Response(
+                {'msg': str(error)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response({'msg': 'Order Placed Successfully.'}, status=status.HTTP_201_CREATED)
+        return Response({
+            'msg': 'Order Placed Successfully.',
+            'order': order.id,
+            'paid_amount': serializers.DecimalField(
+                max_digits=10, decimal_places=2,
+            ).to_representation(order.paid_amount),
+        }, status=status.HTTP_201_CREATED)
 
 
-class ShippingAddressDetail(APIView):
+class ShippingAddressDetail(CustomerContextMixin, APIView):
     """Shipping Address Get Create Update."""
 
     permission_classes = [IsAuthenticated]
     serializer_class = ShippingAddressSerializer
 
     def _get_object(self, request):
-        customer = request.user.customer
-        order, created = Order.objects.get_or_create(
-            customer=customer, complete=False)
-
         shipping_address, created = ShippingAddress.objects.get_or_create(
-            customer=customer,
-            order=order,
+            customer=self.get_customer(),
+            order=self.get_open_order(),
         )
         return shipping_address
 
@@ -218,6 +308,7 @@ class ShippingAddressDetail(APIView):
         serializer = self.serializer_class(shipping_address)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @idempotent
     def post(self, request, format=None):
         serializer = self.serializer_class(
             data=request.data, context={'request': request})
@@ -22,6 +22,7 @@ from core.models import Customer
 class CreateUserView(generics.CreateAPIView):
     """Create a new user in the system."""
     serializer_class = UserSerializer
+    throttle_scope = 'signup'
 
 
 class CreateTokenView(ObtainAuthToken):